@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Online encrypted backups
+Snapshots the live vault with sqlcipher_export, which reads it inside one
+transaction; in WAL mode devices keep writing meanwhile. Each snapshot is
+verified and only the newest few are kept.
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from vault import (export_vault, load_cipher_settings, open_vault, save_cipher_settings,
+                   settings_path)
+
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = 7
+BACKUP_INTERVAL = 24 * 60 * 60  # seconds
+
+
+def snapshot_paths(db_path, backup_dir):
+    """Existing snapshots of a vault, oldest first. Matches <name>-<timestamp>.db exactly,
+    so the snapshots of passwords-work.db are not taken for those of passwords.db"""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    pattern = re.compile(re.escape(stem) + r'-\d{8}-\d{6}\.db')
+    try:
+        names = os.listdir(backup_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(backup_dir, name) for name in names if pattern.fullmatch(name))
+
+
+def verify_snapshot(key, path, settings):
+    """Open a snapshot with the vault key and run SQLite's integrity check.
+    Returns (error or None, {'page_count', 'page_size'} of the snapshot)."""
+    conn = open_vault(key, path, settings, read_only=True)
+    try:
+        pages = {pragma: int(conn.execute(f"PRAGMA {pragma}").fetchone()[0]) for pragma in ('page_count', 'page_size')}
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            return result, pages
+        try:
+            # SQLCipher also checks every page's HMAC; any row is an error
+            errors = conn.execute("PRAGMA cipher_integrity_check").fetchall()
+        except Exception:
+            errors = []
+        return (errors[0][0] if errors else None), pages
+    finally:
+        conn.close()
+
+
+def backup_vault(key, db_path, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    """Take one verified snapshot and rotate old ones; returns a report dict.
+    `key` is the master password or its derive_key() key (same salt, so either opens the copy)."""
+    os.makedirs(backup_dir, mode=0o700, exist_ok=True)
+    settings = load_cipher_settings(db_path)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    path = os.path.join(backup_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.db")
+    partial = path + '.partial'
+
+    start = time.perf_counter()
+    source = open_vault(key, db_path, settings)
+    try:
+        # SQLCipher's backup API refuses encrypted databases; export copies and re-encrypts
+        export_vault(source, partial, key, settings)
+    finally:
+        source.close()
+    duration = time.perf_counter() - start
+
+    error, pages = verify_snapshot(key, partial, settings)
+    if error:
+        os.remove(partial)
+        raise RuntimeError(f"Backup failed verification: {error}")
+    os.replace(partial, path)
+    save_cipher_settings(path, settings)
+
+    for old in snapshot_paths(db_path, backup_dir)[:-keep]:
+        os.remove(old)
+        if os.path.exists(settings_path(old)):
+            os.remove(settings_path(old))
+
+    return {
+        'path': path,
+        'bytes': os.path.getsize(path),
+        'page_count': pages['page_count'],
+        'page_size': pages['page_size'],
+        'seconds': round(duration, 3),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+class BackupScheduler:
+    """Background thread that backs the vault up every `interval` seconds once armed"""
+
+    def __init__(self, db_path, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP, interval=BACKUP_INTERVAL):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.interval = interval
+        self.key = None
+        self.last = None
+        self.last_error = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def arm(self, key):
+        """Backups need the key; start the schedule after the first unlock"""
+        with self.lock:
+            self.key = key
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='backup', daemon=True)
+                self.thread.start()
+
+    def run_now(self):
+        self.wake.set()
+
+    def stop(self):
+        """End the schedule (the vault is being unloaded); a running backup finishes first"""
+        with self.lock:
+            self.stopped = True
+            self.key = None
+        self.wake.set()
+
+    def _seconds_until_due(self):
+        snapshots = snapshot_paths(self.db_path, self.backup_dir)
+        if not snapshots:
+            return 0
+        return max(0, os.path.getmtime(snapshots[-1]) + self.interval - time.time())
+
+    def _loop(self):
+        while True:
+            self.wake.wait(self._seconds_until_due())
+            self.wake.clear()
+            if self.stopped:
+                return
+            try:
+                self.last = backup_vault(self.key, self.db_path, self.backup_dir, self.keep)
+                self.last_error = None
+                print(f"Backup {self.last['path']}: {self.last['bytes'] // 1024} KB "
+                      f"in {self.last['seconds']:.2f}s")
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Backup failed: {e}")
+                # Don't spin on a persistent failure
+                self.wake.wait(min(self.interval, 15 * 60))
+
+    def status(self):
+        return {
+            'last': self.last,
+            'last_error': self.last_error,
+            'snapshots': len(snapshot_paths(self.db_path, self.backup_dir)),
+            'next_in_seconds': round(self._seconds_until_due()) if self.thread else None,
+        }
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Breach check benchmark
+Writes a sorted SHA-1 hash list in the Have I Been Pwned format (1 GB by
+default, generated in order so nothing has to be sorted in memory), fills a
+scratch vault with 10k items of which some use listed passwords, then times
+breach_check.check_vault and reports passwords per second (and with
+--memory, peak Python memory).
+Pass --hash-file to reuse a list from an earlier run (see --keep).
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from breach_check import HashList, check_vault
+
+BENCH_PASSWORD = 'bench-password'
+LINE_BYTES = 46  # 40 hex digits, ':', a count and CRLF, on average
+KEPT_HASH_FILE = 'bench-hashes.txt'
+
+
+def write_hash_list(path, size_mb, listed_passwords, seed=1):
+    """Random hashes spread evenly over the SHA-1 range, plus those of `listed_passwords`"""
+    rng = random.Random(seed)
+    listed = sorted(int(hashlib.sha1(password.encode()).hexdigest(), 16) for password in listed_passwords)
+    lines = size_mb * 1024 * 1024 // LINE_BYTES
+    step = (1 << 160) // lines
+    with open(path, 'w', newline='') as f:
+        n = 0
+        batch = []
+        for i in range(lines):
+            value = i * step + rng.randrange(step)
+            while n < len(listed) and listed[n] <= value:
+                batch.append('%040X:%d\r\n' % (listed[n], rng.randint(1, 99999)))
+                n += 1
+            batch.append('%040X:%d\r\n' % (value, rng.randint(1, 99999)))
+            if len(batch) >= 100000:
+                f.write(''.join(batch))
+                batch = []
+        batch.extend('%040X:%d\r\n' % (value, 1) for value in listed[n:])
+        f.write(''.join(batch))
+
+
+def seed_vault(db_path, items, listed_passwords):
+    from import_bitwarden import create_database
+    from importers import BatchWriter, new_item
+
+    conn = create_database(db_path, BENCH_PASSWORD)
+    listed = iter(listed_passwords)
+    records = (('item', new_item(id=f'bench-{n}', name=f'Site {n}', username=f'user{n}',
+                                 password=next(listed, None) or f'unlisted-{n}'))
+               for n in range(items))
+    BatchWriter(conn).write(records)
+    return conn
+
+
+def timed_check(conn, hash_list, workers, trace):
+    """(seconds, checked, breached, peak bytes or None) for one check of the whole vault"""
+    if trace:
+        # Mapped pages of the list are page cache, not heap: count Python allocations only
+        tracemalloc.start()
+    start = time.perf_counter()
+    checked, breached = check_vault(conn, hash_list, workers=workers)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, checked, breached, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the offline breach check")
+    parser.add_argument('--items', type=int, default=10000, help="items in the vault (default: 10000)")
+    parser.add_argument('--breached', type=int, default=1000, help="items using a listed password")
+    parser.add_argument('--size-mb', type=int, default=1024, help="size of the generated hash list")
+    parser.add_argument('--hash-file', help="use this list instead of generating one")
+    parser.add_argument('--keep', action='store_true', help=f"write the list to {KEPT_HASH_FILE} and keep it")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--memory', action='store_true',
+                        help="also measure peak Python memory (a second, slower run under tracemalloc)")
+    args = parser.parse_args()
+
+    listed_passwords = [f'breached-{n}' for n in range(args.breached)]
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-breach-')
+    hash_file = args.hash_file or (KEPT_HASH_FILE if args.keep else os.path.join(workdir, 'hashes.txt'))
+    try:
+        if not args.hash_file:
+            start = time.perf_counter()
+            write_hash_list(hash_file, args.size_mb, listed_passwords)
+            print(f"Wrote {os.path.getsize(hash_file) / 1e9:.2f} GB hash list in "
+                  f"{time.perf_counter() - start:.0f}s: {hash_file}")
+        conn = seed_vault(os.path.join(workdir, 'bench.db'), args.items, listed_passwords)
+
+        hash_list = HashList(hash_file)
+        try:
+            seconds, checked, breached, _ = timed_check(conn, hash_list, args.workers, trace=False)
+            if args.memory:
+                conn.execute("DELETE FROM breach_results")
+                conn.commit()
+                peak = timed_check(conn, hash_list, args.workers, trace=True)[3]
+        finally:
+            hash_list.close()
+            conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"Checked {checked} passwords against {os.path.basename(hash_file)} in {seconds:.2f}s "
+          f"({checked / seconds:.0f}/s), {breached} found")
+    if args.memory:
+        print(f"Peak Python memory during the check: {peak / 1e6:.1f} MB")
+    if breached != min(args.breached, args.items):
+        print(f"✗ expected {min(args.breached, args.items)} breached passwords")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
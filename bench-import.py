@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Importer throughput benchmark
+Writes a synthetic export with N entries in every supported format, imports
+each into a scratch vault and reports entries per second and peak Python
+memory, so parsers can be compared and regressions spotted
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from xml.sax.saxutils import escape
+
+from importers import IMPORTERS, import_file
+
+
+def write_bitwarden_json(path, entries):
+    with open(path, 'w') as f:
+        f.write('{"encrypted": false, "folders": [{"id": "f1", "name": "Bench"}], "items": [')
+        for i in range(entries):
+            f.write(',' if i else '')
+            json.dump({
+                'id': f'item-{i}', 'folderId': 'f1', 'type': 1, 'name': f'Site {i}',
+                'login': {'username': f'user{i}', 'password': f'pw-{i}', 'uris': [{'uri': f'https://s{i}.example.com'}]},
+                'fields': [{'name': 'pin', 'value': str(i), 'type': 1}] if i % 3 == 0 else [],
+                'revisionDate': '2024-01-01T00:00:00.000Z',
+            }, f)
+        f.write(']}')
+
+
+def write_bitwarden_csv(path, entries):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['folder', 'favorite', 'type', 'name', 'notes', 'fields', 'reprompt',
+                         'login_uri', 'login_username', 'login_password', 'login_totp'])
+        for i in range(entries):
+            writer.writerow(['Bench', '', 'login', f'Site {i}', '', f'pin: {i}' if i % 3 == 0 else '', '0',
+                             f'https://s{i}.example.com', f'user{i}', f'pw-{i}', ''])
+
+
+def write_browser_csv(path, entries):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'url', 'username', 'password'])
+        for i in range(entries):
+            writer.writerow([f's{i}.example.com', f'https://s{i}.example.com/login', f'user{i}', f'pw-{i}'])
+
+
+def write_keepass_xml(path, entries):
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<KeePassFile><Meta><Generator>bench</Generator></Meta>'
+                '<Root><Group><UUID>AAAAAAAAAAAAAAAAAAAAAA==</UUID><Name>Database</Name>'
+                '<Group><UUID>AQEBAQEBAQEBAQEBAQEBAQ==</UUID><Name>Bench</Name>\n')
+        for i in range(entries):
+            f.write(f'<Entry><UUID></UUID><Times><LastModificationTime>2024-01-01T00:00:00Z</LastModificationTime>'
+                    f'</Times><String><Key>Title</Key><Value>{escape(f"Site {i}")}</Value></String>'
+                    f'<String><Key>UserName</Key><Value>user{i}</Value></String>'
+                    f'<String><Key>Password</Key><Value Protected="True">pw-{i}</Value></String>'
+                    f'<String><Key>URL</Key><Value>https://s{i}.example.com</Value></String>'
+                    f'<History><Entry><String><Key>Password</Key><Value>old-{i}</Value></String></Entry></History>'
+                    f'</Entry>\n')
+        f.write('</Group></Group></Root></KeePassFile>\n')
+
+
+WRITERS = {
+    'bitwarden-json': ('export.json', write_bitwarden_json),
+    'bitwarden-csv': ('export.csv', write_bitwarden_csv),
+    'browser-csv': ('passwords.csv', write_browser_csv),
+    'keepass-xml': ('export.xml', write_keepass_xml),
+}
+
+
+def run(fmt, export_path, db_path, trace):
+    """(seconds, counts, peak bytes or None) for one import into a fresh vault"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    from import_bitwarden import create_database
+    conn = create_database(db_path, 'bench-password')
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    counts = import_file(conn, export_path, fmt)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    conn.close()
+    return seconds, counts, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming importers")
+    parser.add_argument('--entries', type=int, default=100000, help="entries per export (default: 100000)")
+    parser.add_argument('--format', action='append', choices=list(IMPORTERS),
+                        help="only these formats (repeatable; default: all)")
+    parser.add_argument('--memory', action='store_true',
+                        help="also measure peak Python memory (a second, slower run under tracemalloc)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-bench-')
+    try:
+        print(f"\n{'Format':16} {'Entries':>8} {'Seconds':>8} {'Entries/s':>10} {'Peak MB':>8}")
+        print("-" * 54)
+        for fmt in args.format or list(IMPORTERS):
+            name, write = WRITERS[fmt]
+            export_path = os.path.join(workdir, name)
+            write(export_path, args.entries)
+            db_path = os.path.join(workdir, 'bench.db')
+            seconds, counts, _ = run(fmt, export_path, db_path, trace=False)
+            peak = run(fmt, export_path, db_path, trace=True)[2] if args.memory else None
+            peak_text = f"{peak / 1e6:8.1f}" if peak is not None else f"{'-':>8}"
+            print(f"{fmt:16} {counts['items']:>8} {seconds:8.2f} {counts['items'] / seconds:10.0f} {peak_text}")
+            os.remove(export_path)
+        print("-" * 54)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Memory replica benchmark
+Seeds a scratch vault (a few logins per site, each site its own domain),
+then times the dashboard listing (item_rows, read to the end) and the
+/api/match domain lookup on a fresh connection per request, as the server
+makes them: once against the encrypted file and once against the decrypted
+in-memory replica. Reports the median of each and the replica's load time.
+Needs SQLCipher; without it there is no replica.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from item_query import item_rows
+from memory_replica import MemoryReplica
+from uri_match import uri_parts
+from vault import USE_SQLCIPHER, derive_key, open_vault, sqlcipher
+
+BENCH_PASSWORD = 'bench-password'
+LOGINS_PER_SITE = 3
+BENCH_FOLDERS = 20
+
+# The lookup /api/match runs for a page's URL
+MATCH_QUERY = """
+    SELECT u.item_id, u.uri, u.host, i.name, i.username, i.folder_id
+    FROM uris u
+    JOIN items i ON i.id = u.item_id
+    WHERE u.domain = ?
+"""
+
+
+def seed_vault(db_path, items, seed=1):
+    from import_bitwarden import create_database
+    from importers import BatchWriter, new_item
+
+    rng = random.Random(seed)
+    folder_ids = [f'bench-folder-{n}' for n in range(BENCH_FOLDERS)]
+    records = [('folder', {'id': folder_id, 'name': f'Folder {n}'}) for n, folder_id in enumerate(folder_ids)]
+    records += [('item', new_item(id=f'bench-{n}', folder_id=rng.choice(folder_ids + [None]), name=f'Site {n}',
+                                  username=f'user{n}@example.com', password=f'pw-{n}',
+                                  uris=[f'https://login.site{n // LOGINS_PER_SITE}.com/']))
+                for n in range(items)]
+    conn = create_database(db_path, BENCH_PASSWORD)
+    BatchWriter(conn).write(records)
+    conn.close()
+
+
+def file_connection(key, db_path):
+    conn = open_vault(key, db_path)
+    conn.row_factory = sqlcipher.Row
+    return conn
+
+
+def timed(connect, query, repeat):
+    """Milliseconds per run of `query(conn)`, each on a new connection closed afterwards"""
+    times = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        conn = connect()
+        try:
+            query(conn, n)
+        finally:
+            conn.close()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def listing(conn, n):
+    for _ in item_rows(conn):
+        pass
+
+
+def match(items):
+    sites = max(1, items // LOGINS_PER_SITE)
+
+    def query(conn, n):
+        _, domain = uri_parts(f'https://www.site{n % sites}.com/')
+        conn.execute(MATCH_QUERY, (domain,)).fetchall()
+    return query
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare reads from the encrypted file and the memory replica")
+    parser.add_argument('--items', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=50, help="runs of each query per source")
+    args = parser.parse_args()
+
+    if not USE_SQLCIPHER:
+        print("✗ the memory replica needs SQLCipher (pip install pysqlcipher3)")
+        sys.exit(1)
+
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-replica-')
+    replica = MemoryReplica(enabled=True)
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        seed_vault(db_path, args.items)
+        key = derive_key(BENCH_PASSWORD, db_path)
+        replica.load(db_path, key)
+
+        sources = (('file', lambda: file_connection(key, db_path)), ('replica', replica.connect))
+        queries = (('listing', listing), ('match', match(args.items)))
+        results = {}
+        for query_name, query in queries:
+            for source_name, connect in sources:
+                results[query_name, source_name] = statistics.median(timed(connect, query, args.repeat))
+    finally:
+        replica.close()
+        shutil.rmtree(workdir)
+
+    print(f"{args.items} items, replica loaded in {replica.load_seconds * 1000:.0f} ms; "
+          f"median of {args.repeat} runs, each on a new connection")
+    print(f"{'query':<9} {'file':>10} {'replica':>10}  speedup")
+    for query_name, _ in queries:
+        on_file, on_replica = results[query_name, 'file'], results[query_name, 'replica']
+        print(f"{query_name:<9} {on_file:>7.2f} ms {on_replica:>7.2f} ms  {on_file / on_replica:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Offline breached-password check
+Looks vault passwords up in a downloaded, sorted SHA-1 hash list (the
+Have I Been Pwned "ordered by hash" format: HASH:COUNT per line) without
+loading it: the file is memory-mapped and binary-searched
+"""
+
+import hashlib
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CHECK_BATCH_SIZE = 500
+CHECK_WORKERS = 4
+
+
+class HashList:
+    """A sorted SHA-1 hash file, searched in place through mmap"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Hex case has to match the file for byte comparisons to follow its sort order
+        self.lowercase = any(c in b'abcdef' for c in self.map[:40])
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def count(self, password):
+        """Times this password appears in the list (0 when it doesn't)"""
+        digest = hashlib.sha1(password.encode('utf-8')).hexdigest()
+        digest = (digest if self.lowercase else digest.upper()).encode('ascii')
+        data = self.map
+        lo, hi = 0, len(data)
+        # lo and hi always sit on line starts; the answer's line starts in [lo, hi)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b'\n', lo, mid) + 1 or lo
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            line_hash = data[start:start + 40]
+            if line_hash == digest:
+                _, _, count = data[start:end].rstrip(b'\r').partition(b':')
+                return int(count) if count.strip() else 1
+            if line_hash < digest:
+                lo = end + 1
+            else:
+                hi = start
+        return 0
+
+
+def check_vault(conn, hash_list, batch_size=CHECK_BATCH_SIZE, workers=CHECK_WORKERS):
+    """Check every item whose password changed since its last check; returns (checked, breached)"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT i.id, i.password, i.password_hash
+        FROM items i
+        LEFT JOIN breach_results b ON b.item_id = i.id
+        WHERE i.password_hash IS NOT NULL
+          AND (b.password_hash IS NULL OR b.password_hash != i.password_hash)
+    """)
+    rows = cursor.fetchmany(batch_size)
+    checked = 0
+    breached = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='breach') as pool:
+        while rows:
+            counts = pool.map(hash_list.count, [row[1] for row in rows])
+            now = datetime.utcnow().isoformat() + 'Z'
+            results = [(row[0], row[2], count, now) for row, count in zip(rows, counts)]
+            # Fetch the next batch before writing so the SELECT cursor isn't reset
+            rows = cursor.fetchmany(batch_size)
+            conn.executemany("""
+                INSERT OR REPLACE INTO breach_results (item_id, password_hash, breach_count, checked_at)
+                VALUES (?, ?, ?, ?)
+            """, results)
+            checked += len(results)
+            breached += sum(1 for result in results if result[2])
+    conn.commit()
+    return checked, breached
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Change journal queries
+Triggers (see vault.migrate) append a (rev, entity, id, op) row for every
+write; this module turns them into delta feeds and compacts old entries
+"""
+
+from datetime import datetime, timedelta
+
+CHANGES_PAGE_SIZE = 500
+JOURNAL_RETENTION_DAYS = 90   # tombstones older than this are forgotten
+RECORDS_BATCH_SIZE = 500      # ids per IN (...) query
+COMPACT_BATCH_SIZE = 500      # journal rows per compaction transaction
+
+
+def current_revision(conn):
+    # AUTOINCREMENT's high-water mark survives compaction, unlike MAX(rev)
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+
+def journal_floor(conn):
+    """Oldest `since` the journal can still answer; older clients must refetch everything"""
+    row = conn.execute("SELECT value FROM vault_meta WHERE key = 'journal_floor'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), RECORDS_BATCH_SIZE):
+        batch = ids[start:start + RECORDS_BATCH_SIZE]
+        yield batch, ','.join('?' * len(batch))
+
+
+def item_records(conn, item_ids):
+    """Full item records (with URIs and fields) for the given ids; {id: record}"""
+    records = {}
+    for batch, placeholders in _batches(item_ids):
+        for row in conn.execute(f"""
+            SELECT id, folder_id, name, username, password, notes, favorite, reprompt, type,
+                   created_date, revision_date
+            FROM items
+            WHERE id IN ({placeholders})
+        """, batch):
+            records[row[0]] = {
+                'id': row[0],
+                'folder_id': row[1],
+                'name': row[2],
+                'username': row[3],
+                'password': row[4],
+                'notes': row[5],
+                'favorite': row[6],
+                'reprompt': row[7],
+                'type': row[8],
+                'created_date': row[9],
+                'revision_date': row[10],
+                'uris': [],
+                'fields': [],
+            }
+        for row in conn.execute(f"""
+            SELECT item_id, uri FROM uris WHERE item_id IN ({placeholders}) ORDER BY item_id, id
+        """, batch):
+            if row[0] in records:
+                records[row[0]]['uris'].append(row[1])
+        for row in conn.execute(f"""
+            SELECT item_id, name, value, type FROM fields WHERE item_id IN ({placeholders}) ORDER BY item_id, id
+        """, batch):
+            if row[0] in records:
+                records[row[0]]['fields'].append({'name': row[1], 'value': row[2], 'type': row[3]})
+    return records
+
+
+def folder_records(conn, folder_ids):
+    records = {}
+    for batch, placeholders in _batches(folder_ids):
+        for row in conn.execute(f"SELECT id, name, revision_date FROM folders WHERE id IN ({placeholders})",
+                                batch):
+            records[row[0]] = {'id': row[0], 'name': row[1], 'revision_date': row[2]}
+    return records
+
+
+def changes_since(conn, since, limit=CHANGES_PAGE_SIZE):
+    """Latest change per entity after revision `since`, with the changed records attached"""
+    # since=0 is a first sync: nothing to delete on the client, so expired tombstones don't matter
+    if 0 < since < journal_floor(conn):
+        return {'since': since, 'rev': current_revision(conn), 'reset': True, 'more': False, 'changes': []}
+
+    # Only each entity's newest entry; idx_changes_entity answers the MAX per row
+    rows = conn.execute("""
+        SELECT c.rev, c.entity, c.entity_id, c.op, c.changed_at
+        FROM changes c
+        WHERE c.rev > ?
+          AND c.rev = (SELECT MAX(rev) FROM changes
+                       WHERE entity = c.entity AND entity_id = c.entity_id)
+        ORDER BY c.rev
+        LIMIT ?
+    """, (since, limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = item_records(conn, [r[2] for r in rows if r[1] == 'item' and r[3] == 'upsert'])
+    folders = folder_records(conn, [r[2] for r in rows if r[1] == 'folder' and r[3] == 'upsert'])
+
+    changes = []
+    for rev, entity, entity_id, op, changed_at in rows:
+        change = {'rev': rev, 'entity': entity, 'id': entity_id, 'op': op, 'changed_at': changed_at}
+        if op == 'upsert':
+            record = (items if entity == 'item' else folders).get(entity_id)
+            if record is None:
+                # Logged as changed but gone now (its delete entry was compacted away)
+                change['op'] = 'delete'
+            else:
+                change[entity] = record
+        changes.append(change)
+
+    return {
+        'since': since,
+        'rev': rows[-1][0] if more else max(since, current_revision(conn)),
+        'reset': False,
+        'more': more,
+        'changes': changes,
+    }
+
+
+def compact_journal(conn, retention_days=JOURNAL_RETENTION_DAYS, batch_size=COMPACT_BATCH_SIZE):
+    """Drop superseded entries and old tombstones, walking the journal in rev ranges of
+    `batch_size` rows and committing each; yields the rows each range removed, so a caller
+    can stop between transactions (nothing is done until it is iterated)"""
+    low, high = conn.execute("SELECT MIN(rev), MAX(rev) FROM changes").fetchone()
+    if high is None:
+        return
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat() + 'Z'
+    newest_expired = conn.execute(
+        "SELECT MAX(rev) FROM changes WHERE op = 'delete' AND changed_at < ?", (cutoff,)).fetchone()[0]
+    if newest_expired is not None:
+        # Raise the floor before any tombstone goes, so a client can't miss one unknowingly
+        conn.execute("""
+            INSERT OR REPLACE INTO vault_meta (key, value) VALUES ('journal_floor', ?)
+        """, (str(max(newest_expired, journal_floor(conn))),))
+        conn.commit()
+
+    start = low
+    while start <= high:
+        end = conn.execute("SELECT rev FROM changes WHERE rev >= ? ORDER BY rev LIMIT 1 OFFSET ?",
+                           (start, batch_size)).fetchone()
+        end = end[0] if end else high + 1
+        removed = conn.execute("""
+            DELETE FROM changes
+            WHERE rev >= ? AND rev < ? AND rev <= ?
+              AND (rev < (SELECT MAX(rev) FROM changes c2
+                          WHERE c2.entity = changes.entity AND c2.entity_id = changes.entity_id)
+                   OR (op = 'delete' AND rev <= ?))
+        """, (start, end, high, -1 if newest_expired is None else newest_expired)).rowcount
+        conn.commit()
+        yield removed
+        start = end
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Concurrent readers and writers
+Seeds a scratch vault, then runs reader threads loading the dashboard next
+to writer threads posting add_item / edit_item, each with its own logged-in
+session like separate devices, through Flask's test client: so the routes'
+connection handling, busy_on_locked and LoadedVault.write's retries are all
+in the path. Fails if any request answers a lock error (503) or anything
+else unexpected, or if p99 latency exceeds the budget. Pages render in one
+Python process, so the dashboard budget grows with the number of readers;
+a reader stuck behind a writer's lock would still blow it.
+Run it after touching open_vault's pragmas, the write path or the routes.
+
+  python check-concurrency.py --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'concurrency-check'
+VAULT = 'concurrency'
+SEED_ITEMS = 500
+READ_P99_BUDGET_MS = 250   # per concurrent reader: a whole 500-item dashboard page
+WRITE_P99_BUDGET_MS = 500
+WRITE_PAUSE = 0.02  # seconds between one writer's requests, like a device saving edits
+LOGIN_TIMEOUT = 30  # seconds to wait out login throttling
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+def load_app(vault_dir):
+    os.environ['CIPHER_WARDEN_VAULT_DIR'] = vault_dir
+    spec = importlib.util.spec_from_file_location('password_manager', os.path.join(HERE, 'password-manager.py'))
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def device(app_module, number):
+    """A test client logged in from its own address, as a separate device would be"""
+    client = app_module.app.test_client()
+    environ = {'REMOTE_ADDR': f'10.0.0.{number + 1}'}
+    deadline = time.monotonic() + LOGIN_TIMEOUT
+    while True:
+        response = client.post('/login', data={'password': PASSWORD, 'vault': VAULT}, environ_base=environ)
+        if response.status_code == 302:
+            return client
+        if response.status_code != 429 or time.monotonic() > deadline:
+            raise RuntimeError(f"login failed: HTTP {response.status_code}")
+        time.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+def reader(client, stop, latencies, errors):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.get('/dashboard')
+        # The page streams: it's only loaded once the body is read
+        response.get_data()
+        if response.status_code != 200:
+            errors.append(f"dashboard: HTTP {response.status_code}")
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def writer(client, items, stop, latencies, errors):
+    rng = random.Random()
+    n = 0
+    while not stop.is_set():
+        n += 1
+        if n % 2:
+            route = '/add_item'
+            form = {'name': f'Added {n}', 'url': f'https://added{n}.example.com', 'username': 'user',
+                    'password': f'pw-{n}'}
+        else:
+            route = '/edit_item'
+            item = rng.randrange(items)
+            form = {'item_id': f'load-item-{item}', 'name': f'Site {item}', 'url': f'https://s{item}.example.com',
+                    'username': f'user{item}@example.com', 'password': f'edited-{n}', 'notes': 'edited'}
+        start = time.perf_counter()
+        response = client.post(route, data=form)
+        if response.status_code != 302:
+            errors.append(f"{route}: HTTP {response.status_code}")
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        stop.wait(WRITE_PAUSE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that readers and writers don\'t block each other')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--items', type=int, default=SEED_ITEMS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-concurrency-')
+    cwd = os.getcwd()
+    try:
+        # Backups the server starts after login land in ./backups
+        os.chdir(workdir)
+        subprocess.run([sys.executable, os.path.join(HERE, 'load-test.py'), 'seed', '--db',
+                        os.path.join(workdir, VAULT + '.db'), '--items', str(args.items), '--password', PASSWORD],
+                       check=True, stdout=subprocess.DEVNULL)
+        app_module = load_app(workdir)
+        clients = [device(app_module, n) for n in range(args.readers + args.writers)]
+        stop = threading.Event()
+        reads, writes, errors = [], [], []
+        threads = ([threading.Thread(target=reader, args=(client, stop, reads, errors))
+                    for client in clients[:args.readers]] +
+                   [threading.Thread(target=writer, args=(client, args.items, stop, writes, errors))
+                    for client in clients[args.readers:]])
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for vault in app_module.VAULTS.loaded.values():
+            vault.unload()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    failures = list(dict.fromkeys(errors))[:5]
+    read_budget = READ_P99_BUDGET_MS * max(1, args.readers)
+    for name, latencies, budget in (('reads', reads, read_budget), ('writes', writes, WRITE_P99_BUDGET_MS)):
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        print(f"{name:<7} {len(latencies):>6}  p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  (budget {budget} ms)")
+        if not latencies:
+            failures.append(f"no {name} completed")
+        elif p99 > budget:
+            failures.append(f"{name} p99 {p99:.1f} ms is over the {budget} ms budget")
+    if errors:
+        print(f"{len(errors)} requests failed")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ no lock errors, p99 within budget")
+
+
+if __name__ == "__main__":
+    main()
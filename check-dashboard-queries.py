@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Dashboard query count
+Loads the dashboard of two scratch vaults, a small and a ten times bigger
+one, through Flask's test client while counting the SQL statements each
+page runs. Fails if custom fields take more than one query per batch of
+FIELDS_BATCH_SIZE items, or if anything else grows with the item count
+(an N+1 query somewhere). Run it after touching the dashboard or its queries.
+"""
+
+import importlib.util
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'query-count-check'
+SIZES = (300, 3000)
+
+
+def load_app(vault_dir):
+    os.environ['CIPHER_WARDEN_VAULT_DIR'] = vault_dir
+    spec = importlib.util.spec_from_file_location('password_manager', os.path.join(HERE, 'password-manager.py'))
+    app_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app_module)
+    return app_module
+
+
+def count_queries(app_module, vault):
+    """(statements touching fields, other statements, items on the page) for one dashboard load"""
+    from vaults import LoadedVault
+
+    statements = []
+    connect = LoadedVault.connect
+
+    def traced_connect(self, *args, **kwargs):
+        conn = connect(self, *args, **kwargs)
+        if conn is not None:
+            conn.set_trace_callback(statements.append)
+        return conn
+
+    client = app_module.app.test_client()
+    response = client.post('/login', data={'password': PASSWORD, 'vault': vault})
+    if response.status_code != 302:
+        raise RuntimeError(f"login to {vault} failed: HTTP {response.status_code}")
+    LoadedVault.connect = traced_connect
+    try:
+        page = client.get('/dashboard').get_data()
+    finally:
+        LoadedVault.connect = connect
+    queries = [sql for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+    fields = [sql for sql in queries if 'FROM fields' in sql]
+    return len(fields), len(queries) - len(fields), page.count(b'data-item-id=')
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-queries-')
+    cwd = os.getcwd()
+    try:
+        # Backups the server starts after login land in ./backups
+        os.chdir(workdir)
+        for items in SIZES:
+            subprocess.run([sys.executable, os.path.join(HERE, 'load-test.py'), 'seed', '--db',
+                            os.path.join(workdir, f'q{items}.db'), '--items', str(items), '--password', PASSWORD],
+                           check=True, stdout=subprocess.DEVNULL)
+        app_module = load_app(workdir)
+        results = {items: count_queries(app_module, f'q{items}') for items in SIZES}
+        for vault in app_module.VAULTS.loaded.values():
+            vault.unload()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    failures = []
+    for items, (fields, other, shown) in results.items():
+        allowed = math.ceil(items / app_module.FIELDS_BATCH_SIZE)
+        print(f"{items:>6} items: {shown} shown, {fields} fields queries (at most {allowed}), {other} other queries")
+        if shown != items:
+            failures.append(f"{items} items: the page shows {shown}")
+        if fields > allowed:
+            failures.append(f"{items} items: {fields} fields queries, at most {allowed} expected")
+    small, big = (results[items][1] for items in SIZES)
+    if big > small:
+        failures.append(f"other queries grow with the vault ({small} -> {big})")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ no per-item queries on the dashboard")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Query plan check for the item listings
+Creates a scratch vault with the current schema, runs EXPLAIN QUERY PLAN for
+every sort key, direction and combination of filters the items API and
+dashboard accept, and fails if any plan scans a table or sorts in a temp
+B-tree. Run it after touching item_query.py or the indexes in vault.migrate.
+"""
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+from import_bitwarden import create_database
+from item_query import AGE_BUCKETS, SORTS, folder_order_query, listing_query, plan_problems
+
+# Values tried for each filter; None here means "filter not given"
+FILTER_VALUES = {
+    'folder': [None, 'folder-id', 'none'],
+    'favorite': [None, 1],
+    'age': [None] + list(AGE_BUCKETS),
+    'has_uri': [None, True, False],
+    'type': [None, 1],
+}
+
+
+def listing_queries(sort, descending, filters):
+    """Every (sql, params) item_query.item_rows runs for one listing"""
+    if sort != 'folder':
+        return [listing_query(sort, descending, filters)]
+    queries = [] if 'folder' in filters else [(folder_order_query(descending), [])]
+    queries.append(listing_query('name', descending, dict(filters, folder=filters.get('folder', 'folder-id'))))
+    return queries
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-plans-')
+    try:
+        conn = create_database(os.path.join(workdir, 'plans.db'), 'plan-check')
+        checked = 0
+        failures = []
+        names = list(FILTER_VALUES)
+        for sort, descending in itertools.product(SORTS, (False, True)):
+            for values in itertools.product(*FILTER_VALUES.values()):
+                filters = {name: value for name, value in zip(names, values) if value is not None}
+                if filters.get('folder') == 'none':
+                    filters['folder'] = None
+                for sql, params in listing_queries(sort, descending, filters):
+                    checked += 1
+                    problems = plan_problems(conn, sql, params)
+                    if problems:
+                        failures.append((sort, 'desc' if descending else 'asc', filters, problems))
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+    for sort, order, filters, problems in failures:
+        print(f"✗ sort={sort} order={order} filters={filters}: {'; '.join(problems)}")
+    if failures:
+        print(f"\n{len(failures)} of {checked} listing queries scan a table or sort in a temp B-tree")
+        sys.exit(1)
+    print(f"✓ {checked} listing queries use indexes only")
+
+
+if __name__ == "__main__":
+    main()
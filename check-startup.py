@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Startup time budget
+Seeds a scratch vault, launches password-manager.py against it a few times
+and measures time from launch to the first byte of the login page, and
+from login to the first byte of the dashboard. Fails if the median of
+either goes over its budget. Run it after touching imports, templates or
+anything the server does before it starts listening.
+
+  python check-startup.py --runs 3 --items 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'startup-check'
+FIRST_BYTE_BUDGET_MS = 1500       # launch -> first byte of /login
+FIRST_DASHBOARD_BUDGET_MS = 3000  # login POST (includes the KDF) -> first byte of /dashboard
+LAUNCH_TIMEOUT = 30  # seconds
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_byte(opener, url, data=None):
+    """Seconds until the response headers arrive; redirects count as answers"""
+    start = time.perf_counter()
+    try:
+        opener.open(url, data, timeout=LAUNCH_TIMEOUT).close()
+    except urllib.error.HTTPError as e:
+        if e.code != 302:
+            raise
+    return time.perf_counter() - start
+
+
+def one_run(vault_dir):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, CIPHER_WARDEN_PORT=str(port), CIPHER_WARDEN_VAULT_DIR=vault_dir)
+    launched = time.perf_counter()
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'password-manager.py')], cwd=vault_dir,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect())
+        while True:
+            try:
+                first_byte(opener, url + '/login')
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if server.poll() is not None or time.perf_counter() - launched > LAUNCH_TIMEOUT:
+                    raise RuntimeError("server didn't start")
+                time.sleep(0.01)
+        to_login = time.perf_counter() - launched
+        login_form = urllib.parse.urlencode({'password': PASSWORD, 'vault': 'startup'}).encode()
+        to_dashboard = first_byte(opener, url + '/login', login_form) + first_byte(opener, url + '/dashboard')
+        with opener.open(url + '/api/status', timeout=LAUNCH_TIMEOUT) as response:
+            startup = json.loads(response.read())['startup']
+        return to_login * 1000, to_dashboard * 1000, startup['import_ms']
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check server startup against its time budget')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--items', type=int, default=2000, help="items in the scratch vault")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-startup-')
+    try:
+        subprocess.run([sys.executable, os.path.join(HERE, 'load-test.py'), 'seed', '--db',
+                        os.path.join(workdir, 'startup.db'), '--items', str(args.items), '--password', PASSWORD],
+                       check=True, stdout=subprocess.DEVNULL)
+        runs = [one_run(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir)
+
+    for n, (to_login, to_dashboard, import_ms) in enumerate(runs, 1):
+        print(f"run {n}: first byte {to_login:6.0f} ms  (imports {import_ms:.0f} ms)  "
+              f"login to dashboard {to_dashboard:6.0f} ms")
+    failures = []
+    for name, values, budget in (('first byte', [run[0] for run in runs], FIRST_BYTE_BUDGET_MS),
+                                 ('login to dashboard', [run[1] for run in runs], FIRST_DASHBOARD_BUDGET_MS)):
+        median = statistics.median(values)
+        if median > budget:
+            failures.append(f"{name}: median {median:.0f} ms is over the {budget} ms budget")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"✓ startup within budget ({FIRST_BYTE_BUDGET_MS} ms to first byte, "
+          f"{FIRST_DASHBOARD_BUDGET_MS} ms login to dashboard)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Two-instance sync check
+Launches two servers on scratch vaults (one seeded, one empty), syncs the
+empty one from the seeded one, makes conflicting edits on both sides, then
+syncs both ways through POST /api/sync. Fails unless both vaults end up
+with the same items and folders, the newer edit winning every conflict, and
+unless a peer missing from CIPHER_WARDEN_PEERS is refused.
+Run it after touching sync.py, the change journal or the write routes.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'sync-check'
+VAULT = 'sync'
+SEED_ITEMS = 200
+LAUNCH_TIMEOUT = 30  # seconds
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Instance:
+    """One server on its own vault directory, with a logged-in session"""
+
+    def __init__(self, name, vault_dir, port, peers):
+        self.name = name
+        self.db_path = os.path.join(vault_dir, VAULT + '.db')
+        self.url = f'http://127.0.0.1:{port}'
+        env = dict(os.environ, CIPHER_WARDEN_PORT=str(port), CIPHER_WARDEN_VAULT_DIR=vault_dir,
+                   CIPHER_WARDEN_PEERS=','.join(peers))
+        self.server = subprocess.Popen([sys.executable, os.path.join(HERE, 'password-manager.py')], cwd=vault_dir,
+                                       env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+    def request(self, path, data=None, json_body=None):
+        """(status, parsed JSON or None) of one request"""
+        headers = {}
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            data = urllib.parse.urlencode(data).encode()
+        request = urllib.request.Request(self.url + path, data, headers)
+        try:
+            with self.opener.open(request, timeout=LAUNCH_TIMEOUT) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, None
+
+    def login(self):
+        started = time.perf_counter()
+        while True:
+            try:
+                status, _ = self.request('/login', {'password': PASSWORD, 'vault': VAULT})
+            except (urllib.error.URLError, ConnectionError):
+                if self.server.poll() is not None or time.perf_counter() - started > LAUNCH_TIMEOUT:
+                    raise RuntimeError(f"{self.name} didn't start")
+                time.sleep(0.05)
+                continue
+            if status != 302:
+                raise RuntimeError(f"login to {self.name} failed: HTTP {status}")
+            return
+
+    def sync_from(self, other):
+        body = {'peer': other.url, 'vault': VAULT, 'password': PASSWORD}
+        status, stats = self.request('/api/sync', json_body=body)
+        if status != 200:
+            raise RuntimeError(f"{self.name} pulling from {other.name}: HTTP {status} {stats}")
+        return stats
+
+    def state(self):
+        """{(entity, id): record} of everything in the vault, from the change feed"""
+        records, since = {}, 0
+        while True:
+            status, feed = self.request(f'/api/changes?since={since}')
+            if status != 200:
+                raise RuntimeError(f"{self.name} /api/changes: HTTP {status}")
+            for change in feed['changes']:
+                if change['op'] == 'upsert':
+                    records[(change['entity'], change['id'])] = change[change['entity']]
+            since = feed['rev']
+            if not feed['more']:
+                return records
+
+    def rename_folder(self, folder_id, name):
+        # A second writer on the file, like the CLI's `folders rename`
+        from vault import open_vault
+        conn = open_vault(PASSWORD, self.db_path)
+        conn.execute("UPDATE folders SET name = ?, revision_date = ? WHERE id = ?",
+                     (name, datetime.utcnow().isoformat() + 'Z', folder_id))
+        conn.commit()
+        conn.close()
+
+    def edit_item(self, item, name):
+        status, _ = self.request('/edit_item', {
+            'item_id': item['id'], 'name': name, 'folder_id': item['folder_id'] or '',
+            'url': item['uris'][0] if item['uris'] else '', 'username': item['username'] or '',
+            'password': item['password'] or '', 'notes': item['notes'] or ''})
+        if status != 302:
+            raise RuntimeError(f"edit on {self.name}: HTTP {status}")
+
+    def delete_item(self, item_id):
+        status, _ = self.request('/delete_item', json_body={'item_id': item_id})
+        if status != 200:
+            raise RuntimeError(f"delete on {self.name}: HTTP {status}")
+
+    def stop(self):
+        self.server.terminate()
+        self.server.wait()
+
+
+def main():
+    from import_bitwarden import create_database
+
+    workdir = tempfile.mkdtemp(prefix='cipher-warden-sync-')
+    instances = []
+    failures = []
+    try:
+        dirs = [os.path.join(workdir, name) for name in ('a', 'b')]
+        for vault_dir in dirs:
+            os.mkdir(vault_dir)
+        subprocess.run([sys.executable, os.path.join(HERE, 'load-test.py'), 'seed', '--db',
+                        os.path.join(dirs[0], VAULT + '.db'), '--items', str(SEED_ITEMS), '--password', PASSWORD],
+                       check=True, stdout=subprocess.DEVNULL)
+        create_database(os.path.join(dirs[1], VAULT + '.db'), PASSWORD).close()
+
+        ports = [free_port(), free_port()]
+        urls = [f'http://127.0.0.1:{port}' for port in ports]
+        a = Instance('a', dirs[0], ports[0], [urls[1]])
+        b = Instance('b', dirs[1], ports[1], [urls[0]])
+        instances = [a, b]
+        a.login()
+        b.login()
+
+        status, _ = a.request('/api/sync', json_body={'peer': f'http://127.0.0.1:{free_port()}'})
+        if status != 403:
+            failures.append(f"sync with an unconfigured peer answered HTTP {status}, not 403")
+
+        start = time.perf_counter()
+        first = b.sync_from(a)
+        print(f"first sync: {first['applied']} changes in {first['pages']} pages "
+              f"({time.perf_counter() - start:.2f}s)")
+
+        seeded = a.state()
+        folder_id = next(key[1] for key in seeded if key[0] == 'folder')
+        edited, deleted, revived = [record for key, record in seeded.items() if key[0] == 'item'][:3]
+        # Each conflict: the older edit first, then the newer one on the other side
+        a.rename_folder(folder_id, 'renamed on a')
+        a.edit_item(edited, 'edited on a')
+        b.delete_item(revived['id'])
+        time.sleep(0.01)
+        b.rename_folder(folder_id, 'renamed on b')
+        b.edit_item(edited, 'edited on b')
+        a.edit_item(revived, 'edited on a after the delete')
+        a.delete_item(deleted['id'])
+
+        for puller, peer in ((a, b), (b, a), (a, b)):
+            stats = puller.sync_from(peer)
+            print(f"{puller.name} <- {peer.name}: {stats['applied']} applied, {stats['skipped']} skipped")
+
+        states = [a.state(), b.state()]
+        expected = {('folder', folder_id): 'renamed on b', ('item', edited['id']): 'edited on b',
+                    ('item', revived['id']): 'edited on a after the delete', ('item', deleted['id']): None}
+        for instance, state in zip(instances, states):
+            for key, name in expected.items():
+                got = state[key]['name'] if key in state else None
+                if got != name:
+                    failures.append(f"{instance.name}: {key[0]} {key[1]} is {got!r}, expected {name!r}")
+        if states[0] != states[1]:
+            differing = sorted(key for key in states[0].keys() | states[1].keys()
+                               if states[0].get(key) != states[1].get(key))
+            failures.append(f"the vaults differ in {len(differing)} records, e.g. {differing[:3]}")
+    finally:
+        for instance in instances:
+            instance.stop()
+        shutil.rmtree(workdir)
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ both instances converged; newer edits won every conflict")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+cipher-warden command line
+One entry point for importing, serving and inspecting the vault.
+Heavy modules (Flask, pysqlcipher3) are only imported by the subcommands
+that need them, and an optional unlock agent keeps one unlocked connection
+around so a series of commands pays for the key derivation once.
+"""
+
+import argparse
+import base64
+import getpass
+import hashlib
+import json
+import os
+import socket
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = 'passwords.db'
+
+# Unlock agent
+AGENT_DIR = os.path.join(os.path.expanduser('~'), '.cipher-warden')
+AGENT_IDLE_TIMEOUT = 15 * 60  # seconds
+AGENT_CLIENT_TIMEOUT = 30  # seconds a client may take to send a request or read a reply
+
+
+def agent_socket_path(db_path):
+    """One agent socket per vault file"""
+    digest = hashlib.sha256(os.path.realpath(db_path).encode()).hexdigest()[:16]
+    return os.environ.get('CIPHER_WARDEN_AGENT') or os.path.join(AGENT_DIR, f'agent-{digest}.sock')
+
+
+class LocalVault:
+    """Vault opened directly in this process"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def query(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description or []]
+        return columns, cursor.fetchall()
+
+    def execute(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        self.conn.commit()
+        return cursor.rowcount
+
+    def export(self):
+        from export_bitwarden import iter_bitwarden_json
+        return iter_bitwarden_json(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+class AgentVault:
+    """Vault reached through a running unlock agent"""
+
+    def __init__(self, sock_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(sock_path)
+        self.stream = self.sock.makefile('rwb')
+
+    def request(self, **message):
+        self.stream.write(json.dumps(message).encode() + b'\n')
+        self.stream.flush()
+        reply = json.loads(self.stream.readline() or b'{"error": "agent closed the connection"}')
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def query(self, sql, params=()):
+        reply = self.request(op='query', sql=sql, params=list(params))
+        return reply['columns'], [tuple(decode_blob(value) for value in row) for row in reply['rows']]
+
+    def execute(self, sql, params=()):
+        return self.request(op='execute', sql=sql, params=list(params))['rowcount']
+
+    def export(self):
+        self.stream.write(b'{"op": "export"}\n')
+        self.stream.flush()
+        while True:
+            reply = json.loads(self.stream.readline() or b'{"error": "agent closed the connection"}')
+            if 'error' in reply:
+                raise RuntimeError(reply['error'])
+            if reply.get('done'):
+                return
+            yield reply['chunk']
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+
+def connect_agent(db_path):
+    sock_path = agent_socket_path(db_path)
+    if not os.path.exists(sock_path):
+        return None
+    try:
+        return AgentVault(sock_path)
+    except OSError:
+        return None
+
+
+def unlock(db_path, password=None):
+    """Prompt for the master password and open the vault (KDF happens here,
+    unless `password` is already a derive_key() key)"""
+    from vault import migrate, open_vault
+
+    if not os.path.exists(db_path):
+        print(f"Error: Database file '{db_path}' not found!")
+        sys.exit(1)
+    if password is None:
+        password = getpass.getpass("Master password: ")
+    try:
+        conn = open_vault(password, db_path)
+        conn.execute("SELECT COUNT(*) FROM folders").fetchone()
+    except Exception:
+        print("Error: Invalid master password")
+        sys.exit(1)
+    migrate(conn)
+    return conn
+
+
+def open_cli_vault(args):
+    """Use the unlock agent when one is running, otherwise unlock locally"""
+    vault = None if args.no_agent else connect_agent(args.db)
+    return vault or LocalVault(unlock(args.db))
+
+
+# Subcommands
+
+def cmd_import(args):
+    import import_bitwarden
+    import_bitwarden.main([args.export_file] + ([args.format] if args.format else []), db_path=args.db,
+                          duplicates=args.duplicates)
+
+
+def cmd_serve(args):
+    import runpy
+    if args.port:
+        os.environ['CIPHER_WARDEN_PORT'] = str(args.port)
+    if args.vault_dir:
+        os.environ['CIPHER_WARDEN_VAULT_DIR'] = args.vault_dir
+    if args.peer:
+        os.environ['CIPHER_WARDEN_PEERS'] = ','.join(args.peer)
+    runpy.run_path(os.path.join(HERE, 'password-manager.py'), run_name='__main__')
+
+
+def cmd_tune(args):
+    import runpy
+    sys.argv = ['tune-vault.py', '--db', args.db] + args.tune_args
+    runpy.run_path(os.path.join(HERE, 'tune-vault.py'), run_name='__main__')
+
+
+def cmd_tables(args):
+    vault = open_cli_vault(args)
+    _, rows = vault.query("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+    vault.close()
+    print(f"\nTables in '{args.db}':")
+    print("-" * 30)
+    for (name,) in rows:
+        print(f" -> {name}")
+    print("-" * 30)
+
+
+def cmd_inspect(args):
+    vault = open_cli_vault(args)
+    _, tables = vault.query("SELECT name FROM sqlite_master WHERE type='table'")
+    if args.table not in {name for (name,) in tables}:
+        vault.close()
+        print(f"Error: no table named '{args.table}'")
+        sys.exit(1)
+
+    print(f"\n--- Structure of '{args.table}' ---")
+    _, columns = vault.query(f'PRAGMA table_info("{args.table}")')
+    for col in columns:
+        print(f"Column: {col[1]:<15} | Type: {col[2]}")
+
+    print(f"\n--- Data in '{args.table}' (First {args.limit} rows) ---")
+    _, rows = vault.query(f'SELECT * FROM "{args.table}" LIMIT ?', (args.limit,))
+    vault.close()
+    if rows:
+        for row in rows:
+            print(row)
+    else:
+        print("Table is empty.")
+
+
+def cmd_folders(args):
+    import uuid
+    from datetime import datetime
+
+    vault = open_cli_vault(args)
+    if args.action == 'list':
+        _, rows = vault.query("""
+            SELECT f.id, f.name, COUNT(i.id)
+            FROM folders f
+            LEFT JOIN items i ON f.id = i.folder_id
+            GROUP BY f.id, f.name
+            ORDER BY f.name
+        """)
+        for folder_id, name, count in rows:
+            print(f"ID: {folder_id} | Name: {name} | Items: {count}")
+    elif args.action == 'rename':
+        if len(args.values) != 2:
+            print("Usage: cipher-warden folders rename <folder-id> <new-name>")
+            sys.exit(1)
+        changed = vault.execute("UPDATE folders SET name = ?, revision_date = ? WHERE id = ?",
+                                (args.values[1], datetime.utcnow().isoformat() + 'Z', args.values[0]))
+        print("Updated!" if changed else "No folder with that ID")
+    elif args.action == 'create':
+        if len(args.values) != 1:
+            print("Usage: cipher-warden folders create <name>")
+            sys.exit(1)
+        folder_id = str(uuid.uuid4())
+        vault.execute("INSERT INTO folders (id, name, revision_date) VALUES (?, ?, ?)",
+                      (folder_id, args.values[0], datetime.utcnow().isoformat() + 'Z'))
+        print(f"Created! ID: {folder_id}")
+    vault.close()
+
+
+def cmd_export(args):
+    vault = open_cli_vault(args)
+    if args.output == '-':
+        for chunk in vault.export():
+            sys.stdout.write(chunk)
+    else:
+        fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            for chunk in vault.export():
+                f.write(chunk)
+        print(f"✓ Exported vault to {args.output} (UNENCRYPTED - handle with care)")
+    vault.close()
+
+
+def cmd_stats(args):
+    vault = open_cli_vault(args)
+    counts = {}
+    for table in ('folders', 'items', 'uris', 'fields'):
+        _, rows = vault.query(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = rows[0][0]
+    _, rows = vault.query("SELECT COUNT(*) FROM items WHERE favorite = 1")
+    favorites = rows[0][0]
+    pragmas = {}
+    for pragma in ('page_size', 'page_count', 'freelist_count', 'journal_mode'):
+        _, rows = vault.query(f"PRAGMA {pragma}")
+        pragmas[pragma] = rows[0][0]
+    vault.close()
+
+    from vault import load_cipher_settings
+    settings = load_cipher_settings(args.db)
+
+    print(f"\nVault: {args.db} ({os.path.getsize(args.db) / 1024:.0f} KiB)")
+    print("-" * 30)
+    print(f"  Folders:   {counts['folders']}")
+    print(f"  Items:     {counts['items']} ({favorites} favorites)")
+    print(f"  URIs:      {counts['uris']}")
+    print(f"  Fields:    {counts['fields']}")
+    print(f"  Pages:     {pragmas['page_count']} x {pragmas['page_size']} bytes ({pragmas['freelist_count']} free)")
+    print(f"  Journal:   {pragmas['journal_mode']}")
+    print(f"  KDF iters: {settings['kdf_iter']}")
+    print("-" * 30)
+
+
+def cmd_vacuum(args):
+    # VACUUM rewrites the whole file, so this always unlocks locally
+    conn = unlock(args.db)
+    before = os.path.getsize(args.db)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    after = os.path.getsize(args.db)
+    print(f"✓ Vacuumed {args.db}: {before / 1024:.0f} KiB -> {after / 1024:.0f} KiB")
+    print("  The server now frees unused pages by itself (incremental vacuum)")
+
+
+def cmd_dedupe(args):
+    from dedupe import dedupe_vault
+
+    # Merges and deletes go straight into the vault, so this always unlocks locally
+    conn = unlock(args.db)
+    try:
+        stats = dedupe_vault(conn, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    if not stats['groups']:
+        print("✓ No duplicate items")
+        return
+    verb = "would be merged" if args.dry_run else "merged"
+    print(f"✓ {stats['removed']} duplicates in {stats['groups']} groups {verb} into the newest copy:")
+    for example in stats['examples']:
+        print(f"  {example}")
+
+
+def cmd_breach_check(args):
+    import time
+    from breach_check import HashList, check_vault
+
+    if not os.path.exists(args.hash_file):
+        print(f"Error: File '{args.hash_file}' not found")
+        sys.exit(1)
+    # Results are written straight into the vault, so this always unlocks locally
+    conn = unlock(args.db)
+    hash_list = HashList(args.hash_file)
+    start = time.perf_counter()
+    try:
+        checked, breached = check_vault(conn, hash_list, workers=args.workers)
+    finally:
+        hash_list.close()
+        conn.close()
+    print(f"Checked {checked} passwords in {time.perf_counter() - start:.2f}s: {breached} found in breaches")
+
+
+def cmd_sync(args):
+    import time
+    from sync import PeerClient, SyncError, pull
+
+    # Sync writes straight into the vault, so this always unlocks locally
+    password = getpass.getpass("Master password: ")
+    conn = unlock(args.db, password)
+    peer_password = getpass.getpass("Peer master password (empty = same): ") or password
+
+    def run_writes(writes):
+        for sql, params in writes:
+            conn.execute(sql, params)
+        conn.commit()
+
+    start = time.perf_counter()
+    try:
+        peer = PeerClient(args.peer, peer_password, args.peer_vault)
+        peer.login()
+        stats = pull(conn, peer, run_writes)
+    except SyncError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+    print(f"✓ Pulled from {stats['peer']} in {time.perf_counter() - start:.2f}s: "
+          f"{stats['applied']} applied, {stats['skipped']} already up to date (revision {stats['rev']})")
+    if stats['reset']:
+        print("  The peer's journal no longer reached our last sync, so its full vault was compared")
+
+
+def cmd_agent(args):
+    sock_path = agent_socket_path(args.db)
+    agent = connect_agent(args.db)
+
+    if args.action == 'status':
+        if agent:
+            reply = agent.request(op='ping')
+            agent.close()
+            print(f"Agent running (pid {reply['pid']}) for {reply['db']}")
+        else:
+            print("No agent running")
+        return
+
+    if args.action == 'stop':
+        if agent:
+            agent.request(op='stop')
+            agent.close()
+            print("Agent stopped")
+        else:
+            print("No agent running")
+        return
+
+    if agent:
+        agent.close()
+        print("Agent already running")
+        return
+    if os.path.exists(sock_path):
+        os.remove(sock_path)  # stale socket from a crashed agent
+
+    from vault import derive_key
+
+    if not os.path.exists(args.db):
+        print(f"Error: Database file '{args.db}' not found!")
+        sys.exit(1)
+    # Run the KDF once and check the key here, but don't hold the vault open across
+    # fork(): the child's connection must be its own, with its own file locks
+    key = derive_key(getpass.getpass("Master password: "), args.db)
+    unlock(args.db, key).close()
+    os.makedirs(os.path.dirname(sock_path), mode=0o700, exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(sock_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(4)
+
+    if not args.foreground:
+        if os.fork():
+            print(f"✓ Agent started; vault stays unlocked until 'cipher-warden agent stop' "
+                  f"or {args.idle_timeout // 60} idle minutes")
+            return
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+
+    conn = unlock(args.db, key)
+    try:
+        run_agent(server, conn, args.db, args.idle_timeout)
+    finally:
+        server.close()
+        conn.close()
+        if os.path.exists(sock_path):
+            os.remove(sock_path)
+    if not args.foreground:
+        os._exit(0)
+
+
+def encode_blob(value):
+    """json.dumps default for agent replies: BLOB values travel as base64"""
+    if isinstance(value, (bytes, memoryview)):
+        return {'base64': base64.b64encode(bytes(value)).decode('ascii')}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def decode_blob(value):
+    return base64.b64decode(value['base64']) if isinstance(value, dict) else value
+
+
+def run_agent(server, conn, db_path, idle_timeout):
+    """Serve queries over the agent socket until stopped or idle"""
+    server.settimeout(idle_timeout)
+    while True:
+        try:
+            client, _ = server.accept()
+        except socket.timeout:
+            return
+        # A client that stops reading or writing mid-request mustn't hang the agent
+        client.settimeout(AGENT_CLIENT_TIMEOUT)
+        try:
+            with client, client.makefile('rwb') as stream:
+                for line in stream:
+                    try:
+                        message = json.loads(line)
+                        op = message.get('op')
+                        if op == 'stop':
+                            stream.write(b'{"ok": true}\n')
+                            stream.flush()
+                            return
+                        if op == 'ping':
+                            reply = {'pid': os.getpid(), 'db': os.path.realpath(db_path)}
+                        elif op == 'query':
+                            cursor = conn.execute(message['sql'], message.get('params', []))
+                            reply = {'columns': [d[0] for d in cursor.description or []],
+                                     'rows': [list(row) for row in cursor.fetchall()]}
+                        elif op == 'export':
+                            from export_bitwarden import iter_bitwarden_json
+                            for chunk in iter_bitwarden_json(conn):
+                                stream.write(json.dumps({'chunk': chunk}).encode() + b'\n')
+                            reply = {'done': True}
+                        elif op == 'execute':
+                            cursor = conn.execute(message['sql'], message.get('params', []))
+                            conn.commit()
+                            reply = {'rowcount': cursor.rowcount}
+                        else:
+                            reply = {'error': f'unknown op {op!r}'}
+                        data = json.dumps(reply, default=encode_blob)
+                    except Exception as e:
+                        conn.rollback()
+                        data = json.dumps({'error': str(e)})
+                    stream.write(data.encode() + b'\n')
+                    stream.flush()
+        except OSError:
+            # Timed out or hung up; the next client gets a fresh start
+            continue
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cipher-warden', description="Local encrypted password vault")
+    parser.add_argument('--db', default=DB_PATH, help="vault file (default: passwords.db)")
+    parser.add_argument('--no-agent', action='store_true', help="don't use a running unlock agent")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('import', help="import a Bitwarden, browser or KeePass export into a new vault")
+    p.add_argument('export_file')
+    p.add_argument('--format', choices=['bitwarden-json', 'bitwarden-csv', 'browser-csv', 'keepass-xml'],
+                   help="export format (detected from the file when omitted)")
+    p.add_argument('--duplicates', choices=['skip', 'merge', 'report'], default='skip',
+                   help="items the vault already has: skip them (default), merge their extra notes and "
+                        "fields into the existing item, or import them anyway and list them")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('serve', help="start the web interface")
+    p.add_argument('--port', type=int, help="port to listen on (default: 5000)")
+    p.add_argument('--vault-dir', help="serve every *.db vault in this directory (default: current directory)")
+    p.add_argument('--peer', action='append', help="instance POST /api/sync may pull from (repeatable)")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('tune', help="benchmark and change SQLCipher settings (see tune-vault.py --help)")
+    p.add_argument('tune_args', nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_tune)
+
+    p = sub.add_parser('tables', help="list the tables in the vault")
+    p.set_defaults(func=cmd_tables)
+
+    p = sub.add_parser('inspect', help="show a table's columns and first rows")
+    p.add_argument('table')
+    p.add_argument('--limit', type=int, default=5)
+    p.set_defaults(func=cmd_inspect)
+
+    p = sub.add_parser('folders', help="list, rename or create folders")
+    p.add_argument('action', choices=['list', 'rename', 'create'], nargs='?', default='list')
+    p.add_argument('values', nargs='*')
+    p.set_defaults(func=cmd_folders)
+
+    p = sub.add_parser('export', help="export the vault as Bitwarden JSON (unencrypted)")
+    p.add_argument('-o', '--output', default='-', help="output file (default: stdout)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('stats', help="show vault statistics")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('vacuum', help="compact the vault and enable incremental vacuum")
+    p.set_defaults(func=cmd_vacuum)
+
+    p = sub.add_parser('dedupe', help="merge items with the same name, username, URIs and password")
+    p.add_argument('--dry-run', action='store_true', help="only list the duplicates")
+    p.set_defaults(func=cmd_dedupe)
+
+    p = sub.add_parser('breach-check', help="flag passwords found in a downloaded SHA-1 breach list")
+    p.add_argument('hash_file', help="sorted SHA-1 list, e.g. pwned-passwords-sha1-ordered-by-hash.txt")
+    p.add_argument('--workers', type=int, default=4)
+    p.set_defaults(func=cmd_breach_check)
+
+    p = sub.add_parser('sync', help="pull changes from another running instance")
+    p.add_argument('peer', help="the other instance's URL, e.g. http://192.168.1.20:5000")
+    p.add_argument('--peer-vault', help="which of the peer's vaults to pull from (default: its default vault)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser('agent', help="keep the vault unlocked for following commands")
+    p.add_argument('action', choices=['start', 'stop', 'status'], nargs='?', default='start')
+    p.add_argument('--idle-timeout', type=int, default=AGENT_IDLE_TIMEOUT, help="seconds before the agent exits")
+    p.add_argument('--foreground', action='store_true')
+    p.set_defaults(func=cmd_agent)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Duplicate items
+Every item carries a fingerprint (vault.item_fingerprint) in an indexed
+column, so spotting a duplicate is one index lookup. Importers use it to
+skip, merge or report items the vault already has; dedupe_vault() cleans
+up an existing vault in one pass over the fingerprint index.
+"""
+
+from datetime import datetime
+from itertools import groupby
+
+DUPLICATE_MODES = ('skip', 'merge', 'report')
+DUPLICATE_REPORT_LIMIT = 20  # example names kept for the import summary
+
+
+def find_duplicate(conn, fingerprint):
+    """Id of an item with this fingerprint, or None"""
+    row = conn.execute("SELECT id FROM items WHERE fingerprint = ? LIMIT 1", (fingerprint,)).fetchone()
+    return row[0] if row else None
+
+
+def item_fields(conn, item_id):
+    return [tuple(row) for row in conn.execute(
+        "SELECT name, value, type FROM fields WHERE item_id = ? ORDER BY id", (item_id,))]
+
+
+def merge_writes(conn, keeper_id, other):
+    """Writes folding `other` (notes, favorite, folder_id and fields as (name, value, type))
+    into the item `keeper_id`; nothing that only `other` has is lost"""
+    keeper = conn.execute("SELECT notes, favorite, folder_id FROM items WHERE id = ?", (keeper_id,)).fetchone()
+    notes, favorite, folder_id = keeper[0] or '', keeper[1] or 0, keeper[2]
+    changed = False
+    other_notes = (other['notes'] or '').strip()
+    if other_notes and other_notes not in notes:
+        notes = f"{notes}\n\n{other_notes}" if notes else other_notes
+        changed = True
+    if other['favorite'] and not favorite:
+        favorite = 1
+        changed = True
+    if other['folder_id'] and not folder_id:
+        folder_id = other['folder_id']
+        changed = True
+
+    writes = []
+    have = {(name, value) for name, value, _ in item_fields(conn, keeper_id)}
+    for name, value, field_type in other['fields']:
+        if (name, value) not in have:
+            have.add((name, value))
+            writes.append(("INSERT INTO fields (item_id, name, value, type) VALUES (?, ?, ?, ?)",
+                           (keeper_id, name, value, field_type)))
+            changed = True
+    if changed:
+        # A newer revision_date lets synced peers take the merged item
+        writes.insert(0, ("UPDATE items SET notes = ?, favorite = ?, folder_id = ?, revision_date = ? WHERE id = ?",
+                          (notes, favorite, folder_id, datetime.utcnow().isoformat() + 'Z', keeper_id)))
+    return writes
+
+
+def delete_writes(item_id):
+    return [
+        ("DELETE FROM uris WHERE item_id = ?", (item_id,)),
+        ("DELETE FROM fields WHERE item_id = ?", (item_id,)),
+        ("DELETE FROM breach_results WHERE item_id = ?", (item_id,)),
+        ("DELETE FROM items WHERE id = ?", (item_id,)),
+    ]
+
+
+def dedupe_vault(conn, dry_run=False):
+    """Merge every group of items sharing a fingerprint into its most recently revised item.
+    Returns {'groups', 'removed', 'examples'}; commits unless dry_run."""
+    rows = conn.execute("""
+        SELECT id, name, notes, favorite, folder_id, fingerprint
+        FROM items
+        WHERE fingerprint IN (SELECT fingerprint FROM items GROUP BY fingerprint HAVING COUNT(*) > 1)
+        ORDER BY fingerprint, revision_date DESC, id
+    """).fetchall()
+    stats = {'groups': 0, 'removed': 0, 'examples': []}
+    for _, group in groupby(rows, key=lambda row: row[5]):
+        keeper, *others = group
+        stats['groups'] += 1
+        stats['removed'] += len(others)
+        if len(stats['examples']) < DUPLICATE_REPORT_LIMIT:
+            stats['examples'].append(f"{keeper[1]} (×{len(others) + 1})")
+        if dry_run:
+            continue
+        for other in others:
+            writes = merge_writes(conn, keeper[0], {
+                'notes': other[2], 'favorite': other[3], 'folder_id': other[4],
+                'fields': item_fields(conn, other[0]),
+            }) + delete_writes(other[0])
+            # Applied right away so the next merge into the same keeper sees this one
+            for sql, params in writes:
+                conn.execute(sql, params)
+    if not dry_run:
+        conn.commit()
+    return stats
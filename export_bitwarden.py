@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+SQLCipher Database to Bitwarden JSON Exporter
+Streams the vault back out in Bitwarden's (unencrypted) export format
+"""
+
+import json
+
+# Rows fetched from each cursor at a time, and items per yielded chunk
+EXPORT_CHUNK_SIZE = 500
+
+
+def _grouped(cursor, chunk_size):
+    """Yield (item_id, rows) from a cursor ordered by item_id"""
+    current_id = None
+    group = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            if group and row[0] != current_id:
+                yield current_id, group
+                group = []
+            current_id = row[0]
+            group.append(row)
+    if group:
+        yield current_id, group
+
+
+class _MergeCursor:
+    """Hands out the rows belonging to each item, walking item ids in order"""
+
+    def __init__(self, cursor, chunk_size):
+        self.groups = _grouped(cursor, chunk_size)
+        self.pending = next(self.groups, None)
+
+    def rows_for(self, item_id):
+        # Skip rows whose item no longer exists
+        while self.pending is not None and self.pending[0] < item_id:
+            self.pending = next(self.groups, None)
+        if self.pending is not None and self.pending[0] == item_id:
+            rows = self.pending[1]
+            self.pending = next(self.groups, None)
+            return rows
+        return []
+
+
+def iter_bitwarden_json(conn, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the vault as Bitwarden JSON text, a chunk of items at a time"""
+    yield '{\n  "encrypted": false,\n  "folders": ['
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, name FROM folders ORDER BY id")
+    separator = '\n    '
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        parts = []
+        for row in rows:
+            parts.append(separator + json.dumps({'id': row[0], 'name': row[1]}))
+            separator = ',\n    '
+        yield ''.join(parts)
+    yield '\n  ],\n  "items": ['
+
+    # Items, URIs and fields are read in item id order by three cursors at
+    # once and merged, so no table is ever held in memory
+    uris = conn.cursor()
+    uris.execute("SELECT item_id, uri FROM uris ORDER BY item_id, id")
+    uris = _MergeCursor(uris, chunk_size)
+    fields = conn.cursor()
+    fields.execute("SELECT item_id, name, value, type FROM fields ORDER BY item_id, id")
+    fields = _MergeCursor(fields, chunk_size)
+
+    cursor.execute("""
+        SELECT id, folder_id, name, username, password, notes, favorite, reprompt, type,
+               created_date, revision_date
+        FROM items
+        ORDER BY id
+    """)
+    separator = '\n    '
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        parts = []
+        for row in rows:
+            item = {
+                'id': row[0],
+                'organizationId': None,
+                'folderId': row[1],
+                'type': row[8],
+                'reprompt': row[7],
+                'name': row[2],
+                'notes': row[5] or None,
+                'favorite': bool(row[6]),
+                'fields': [
+                    {'name': field[1], 'value': field[2], 'type': field[3], 'linkedId': None}
+                    for field in fields.rows_for(row[0])
+                ],
+                'collectionIds': None,
+                'creationDate': row[9],
+                'revisionDate': row[10],
+            }
+            # Bitwarden expects the block matching the type: login for 1, secureNote for 2
+            if row[8] == 1:
+                item['login'] = {
+                    'uris': [{'match': None, 'uri': uri[1]} for uri in uris.rows_for(row[0])],
+                    'username': row[3] or None,
+                    'password': row[4] or None,
+                    'totp': None,
+                }
+            elif row[8] == 2:
+                item['secureNote'] = {'type': 0}
+            parts.append(separator + json.dumps(item))
+            separator = ',\n    '
+        yield ''.join(parts)
+    yield '\n  ]\n}\n'
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Nested folders
+Bitwarden nests folders by naming them "Parent/Child". The tree is read
+from an index on the folder path with '/' mapped to the lowest character,
+so each subtree is one contiguous index range: children are found by
+skip-scanning that range and subtree item counts are summed from the
+per-folder counts in folder_stats (kept by triggers), never from items.
+"""
+
+SEPARATOR = '/'
+
+# Sort key of a folder path; '/' becomes char(1) so "A/B" sorts right after "A",
+# before siblings like "A-B". Queries must use the exact expression to hit idx_folders_path.
+PATH_KEY = "replace(name, '/', char(1))"
+CHILD_MARK = '\x01'
+AFTER_SUBTREE = '\x02'
+
+
+def path_key(path):
+    return path.replace(SEPARATOR, CHILD_MARK)
+
+
+def folder_node(conn, path):
+    """One tree node: the folder named `path` (if there is one) with its direct and subtree item counts.
+    A path that only exists as a prefix ("A" for a folder "A/B") has id None."""
+    key = path_key(path)
+    row = conn.execute(f"""
+        SELECT MAX(CASE WHEN f.name = ? THEN f.id END),
+               MAX(CASE WHEN f.name = ? THEN COALESCE(s.items, 0) END),
+               COALESCE(SUM(s.items), 0),
+               SUM(f.name != ?)
+        FROM folders f
+        LEFT JOIN folder_stats s ON s.folder_id = f.id
+        WHERE {PATH_KEY} >= ? AND {PATH_KEY} < ?
+    """, (path, path, path, key, key + AFTER_SUBTREE)).fetchone()
+    folder_id, items, total, descendants = row
+    return {
+        'path': path,
+        'name': path.rsplit(SEPARATOR, 1)[-1],
+        'id': folder_id,
+        'items': items or 0,
+        'total': total,
+        'children': bool(descendants),
+    }
+
+
+def child_paths(conn, parent=''):
+    """Paths of the folders directly under `parent` ('' for the top level), one index seek each"""
+    if parent:
+        prefix = parent + SEPARATOR
+        bound, end = path_key(prefix), path_key(parent) + AFTER_SUBTREE
+    else:
+        prefix, bound, end = '', '', None
+    paths = []
+    while True:
+        if end is None:
+            row = conn.execute(f"SELECT name FROM folders WHERE {PATH_KEY} >= ? ORDER BY {PATH_KEY} LIMIT 1",
+                               (bound,)).fetchone()
+        else:
+            row = conn.execute(f"""
+                SELECT name FROM folders WHERE {PATH_KEY} >= ? AND {PATH_KEY} < ?
+                ORDER BY {PATH_KEY} LIMIT 1
+            """, (bound, end)).fetchone()
+        if row is None:
+            return paths
+        path = prefix + row[0][len(prefix):].split(SEPARATOR, 1)[0]
+        paths.append(path)
+        # Skip the rest of this child's subtree
+        bound = path_key(path) + AFTER_SUBTREE
+
+
+def child_folders(conn, parent=''):
+    """Tree nodes directly under `parent`, in path order"""
+    return [folder_node(conn, path) for path in child_paths(conn, parent)]
@@ -1,35 +1,33 @@
 #!/usr/bin/env python3
 """
-Bitwarden JSON to SQLCipher Database Importer
-Converts Bitwarden export to encrypted local database
+Password export to SQLCipher Database Importer
+Converts a Bitwarden, browser or KeePass export to an encrypted local database
+(the parsers live in importers.py)
 """
 
-import json
-import sqlite3
 import sys
 import getpass
 from pathlib import Path
 from datetime import datetime
 
-# Try to import pysqlcipher3, fallback to regular sqlite with warning
-try:
-    from pysqlcipher3 import dbapi2 as sqlcipher
-    USE_SQLCIPHER = True
-except ImportError:
+from importers import IMPORTERS, ImportFormatError, detect_format, import_file
+from vault import USE_SQLCIPHER, migrate, open_vault
+
+if not USE_SQLCIPHER:
     print("WARNING: pysqlcipher3 not installed. Using unencrypted SQLite.")
     print("Install with: pip install pysqlcipher3")
-    USE_SQLCIPHER = False
-    sqlcipher = sqlite3
 
 
 def create_database(db_path, password=None):
     """Create encrypted database with schema"""
-    if USE_SQLCIPHER:
-        conn = sqlcipher.connect(db_path)
-        conn.execute(f"PRAGMA key = '{password}'")
-        conn.execute("PRAGMA cipher_compatibility = 4")
-    else:
-        conn = sqlite3.connect(db_path)
+    conn = open_vault(password, db_path)
+
+    # Lets the server give free pages back in small steps; on a new, empty
+    # file the VACUUM that applies the setting is instant
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if not conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
 
     cursor = conn.cursor()
 
@@ -56,6 +54,7 @@ def create_database(db_path, password=None):
             type INTEGER DEFAULT 1,
             created_date TEXT,
             revision_date TEXT,
+            password_hash TEXT,
             FOREIGN KEY (folder_id) REFERENCES folders(id)
         )
     """)
@@ -66,6 +65,8 @@ def create_database(db_path, password=None):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             item_id TEXT NOT NULL,
             uri TEXT NOT NULL,
+            host TEXT,
+            domain TEXT,
             FOREIGN KEY (item_id) REFERENCES items(id)
         )
     """)
@@ -88,76 +89,25 @@ def create_database(db_path, password=None):
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_uris_item ON uris(item_id)")
 
     conn.commit()
+    migrate(conn)
     return conn
 
 
-def import_data(conn, json_file):
-    """Import Bitwarden JSON data into database"""
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-
-    cursor = conn.cursor()
-
-    # Import folders
-    folders = data.get('folders', [])
-    print(f"Importing {len(folders)} folders...")
-    for folder in folders:
-        cursor.execute("""
-            INSERT OR REPLACE INTO folders (id, name)
-            VALUES (?, ?)
-        """, (folder['id'], folder['name']))
-
-    # Import items
-    items = data.get('items', [])
-    print(f"Importing {len(items)} items...")
-
-    for item in items:
-        login = item.get('login', {})
-
-        cursor.execute("""
-            INSERT OR REPLACE INTO items
-            (id, folder_id, name, username, password, notes, favorite, reprompt, type, created_date, revision_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            item['id'],
-            item.get('folderId'),
-            item['name'],
-            login.get('username', ''),
-            login.get('password', ''),
-            item.get('notes', ''),
-            item.get('favorite', 0),
-            item.get('reprompt', 0),
-            item.get('type', 1),
-            item.get('creationDate'),
-            item.get('revisionDate')
-        ))
-
-        # Import URIs
-        uris = login.get('uris', [])
-        for uri_obj in uris:
-            if uri_obj.get('uri'):
-                cursor.execute("""
-                    INSERT INTO uris (item_id, uri)
-                    VALUES (?, ?)
-                """, (item['id'], uri_obj['uri']))
-
-        # Import custom fields
-        fields = item.get('fields', [])
-        for field in fields:
-            cursor.execute("""
-                INSERT INTO fields (item_id, name, value, type)
-                VALUES (?, ?, ?, ?)
-            """, (
-                item['id'],
-                field.get('name'),
-                field.get('value'),
-                field.get('type')
-            ))
-
-    conn.commit()
+def import_data(conn, export_file, fmt=None, duplicates='skip'):
+    """Stream an export (Bitwarden JSON/CSV, browser CSV, KeePass XML) into the database.
+    Items already in the vault are skipped, merged or reported (see dedupe.py)."""
+    fmt = fmt or detect_format(export_file)
+    print(f"Importing {IMPORTERS[fmt][2]}...")
+    counts = import_file(conn, export_file, fmt, duplicates=duplicates)
     print("Import completed successfully!")
+    if counts['duplicates']:
+        action = {'skip': 'skipped', 'merge': 'merged into the existing items', 'report': 'imported anyway'}
+        print(f"\n{counts['duplicates']} duplicates {action[duplicates]}, e.g.:")
+        for name in counts['duplicate_names']:
+            print(f"  {name}")
 
     # Print summary
+    cursor = conn.cursor()
     cursor.execute("SELECT COUNT(*) FROM folders")
     folder_count = cursor.fetchone()[0]
     cursor.execute("SELECT COUNT(*) FROM items")
@@ -171,19 +121,31 @@ def import_data(conn, json_file):
     print(f"  URIs: {uri_count}")
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python import_bitwarden.py <bitwarden_export.json>")
+def main(argv=None, db_path="passwords.db", duplicates='skip'):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) < 1:
+        print("Usage: python import_bitwarden.py <export file> [format]")
         print("\nThis will create an encrypted 'passwords.db' file")
+        print("Formats (detected when omitted):")
+        for name, (_, _, description) in IMPORTERS.items():
+            print(f"  {name:15} {description}")
         sys.exit(1)
 
-    json_file = sys.argv[1]
+    export_file = argv[0]
+    fmt = argv[1] if len(argv) > 1 else None
 
-    if not Path(json_file).exists():
-        print(f"Error: File '{json_file}' not found")
+    if not Path(export_file).exists():
+        print(f"Error: File '{export_file}' not found")
+        sys.exit(1)
+    try:
+        fmt = fmt or detect_format(export_file)
+    except ImportFormatError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if fmt not in IMPORTERS:
+        print(f"Error: Unknown format '{fmt}' (known: {', '.join(IMPORTERS)})")
         sys.exit(1)
-
-    db_path = "passwords.db"
 
     # Get master password
     if USE_SQLCIPHER:
@@ -209,8 +171,13 @@ def main():
     print(f"\nCreating database: {db_path}")
     conn = create_database(db_path, password)
 
-    print(f"Importing from: {json_file}")
-    import_data(conn, json_file)
+    print(f"Importing from: {export_file}")
+    try:
+        import_data(conn, export_file, fmt, duplicates)
+    except ImportFormatError as e:
+        conn.close()
+        print(f"Error: {e}")
+        sys.exit(1)
 
     conn.close()
 
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Streaming importers
+Each supported export format has a parser that reads the file incrementally
+and yields folders and items one at a time; a shared BatchWriter inserts
+them into the folders/items/uris/fields tables in batches. Memory stays flat
+however large the export is.
+"""
+
+import base64
+import csv
+import json
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from dedupe import DUPLICATE_REPORT_LIMIT, find_duplicate, merge_writes
+from uri_match import normalise_host, uri_parts
+from vault import get_hmac_key, item_fingerprint, password_hash
+
+IMPORT_BATCH_SIZE = 1000   # items per executemany round
+READ_CHUNK = 64 * 1024     # bytes read at a time by the JSON reader
+IMPORT_CACHE_KIB = 32000   # SQLite page cache while importing (random-key indexes need it)
+EXISTING_IDS_BATCH = 500   # ids per IN (...) lookup of already imported items
+
+FIELD_TYPE_TEXT = 0
+FIELD_TYPE_HIDDEN = 1
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def new_item(**values):
+    """An item record as the parsers yield it"""
+    item = {
+        'id': None, 'folder_id': None, 'name': '', 'username': '', 'password': '', 'notes': '',
+        'favorite': 0, 'reprompt': 0, 'type': 1, 'created_date': None, 'revision_date': None,
+        'uris': [], 'fields': [],
+    }
+    item.update(values)
+    if not item['id']:
+        item['id'] = str(uuid.uuid4())
+    return item
+
+
+class FolderNames:
+    """Folder ids for formats that only name folders, yielding each folder once"""
+
+    def __init__(self):
+        self.ids = {}
+
+    def get(self, name):
+        """(folder_id, folder record or None if it was already yielded)"""
+        if not name:
+            return None, None
+        if name in self.ids:
+            return self.ids[name], None
+        folder_id = self.ids[name] = str(uuid.uuid4())
+        return folder_id, {'id': folder_id, 'name': name}
+
+
+class BatchWriter:
+    """Collects parsed records and writes them with executemany.
+    Items the vault (or the import so far) already has are skipped, merged
+    into the existing item or imported anyway and reported, per `duplicates`."""
+
+    def __init__(self, conn, batch_size=IMPORT_BATCH_SIZE, duplicates='skip'):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.duplicates = duplicates
+        self.hmac_key = get_hmac_key(conn)
+        self.items = []
+        self.uris = []
+        self.fields = []
+        # Fingerprints of the unflushed batch, which the index can't see yet
+        self.pending = set()
+        self.counts = {'folders': 0, 'items': 0, 'uris': 0, 'fields': 0, 'duplicates': 0, 'duplicate_names': []}
+
+    def folder(self, folder):
+        self.conn.execute("INSERT OR REPLACE INTO folders (id, name, revision_date) VALUES (?, ?, ?)",
+                          (folder['id'], folder['name'], datetime.utcnow().isoformat() + 'Z'))
+        self.counts['folders'] += 1
+
+    def duplicate_of(self, fingerprint):
+        """Id of an item already in the vault with this fingerprint, or None"""
+        if fingerprint in self.pending:
+            self.flush()
+        return find_duplicate(self.conn, fingerprint)
+
+    def item(self, item):
+        digest = password_hash(self.hmac_key, item['password'])
+        fingerprint = item_fingerprint(self.hmac_key, item['name'], item['username'], item['uris'], digest)
+        existing = self.duplicate_of(fingerprint)
+        if existing is not None:
+            self.counts['duplicates'] += 1
+            if len(self.counts['duplicate_names']) < DUPLICATE_REPORT_LIMIT:
+                self.counts['duplicate_names'].append(item['name'] or '')
+            if self.duplicates == 'skip':
+                return
+            if self.duplicates == 'merge':
+                for sql, params in merge_writes(self.conn, existing, item):
+                    self.conn.execute(sql, params)
+                return
+        self.pending.add(fingerprint)
+        self.items.append((
+            item['id'], item['folder_id'], item['name'] or '', item['username'], item['password'], item['notes'],
+            item['favorite'], item['reprompt'], item['type'], item['created_date'], item['revision_date'],
+            digest, fingerprint,
+        ))
+        for uri in item['uris']:
+            if uri:
+                self.uris.append((item['id'], uri) + uri_parts(uri))
+        for name, value, field_type in item['fields']:
+            self.fields.append((item['id'], name, value, field_type))
+        if len(self.items) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Re-imported ids are updated in place (INSERT OR REPLACE would skip the folder count
+        # triggers) and lose their old URIs and fields, which the batch brings again
+        existing = set()
+        ids = list({row[0] for row in self.items})
+        for start in range(0, len(ids), EXISTING_IDS_BATCH):
+            batch = ids[start:start + EXISTING_IDS_BATCH]
+            existing.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM items WHERE id IN ({','.join('?' * len(batch))})", batch))
+        new_ids = set()
+        inserts, updates = [], []
+        for row in self.items:
+            if row[0] in existing or row[0] in new_ids:
+                updates.append(row[1:] + row[:1])
+            else:
+                new_ids.add(row[0])
+                inserts.append(row)
+        self.conn.executemany("""
+            INSERT INTO items
+            (id, folder_id, name, username, password, notes, favorite, reprompt, type, created_date, revision_date,
+             password_hash, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+        self.conn.executemany("""
+            UPDATE items
+            SET folder_id = ?, name = ?, username = ?, password = ?, notes = ?, favorite = ?, reprompt = ?,
+                type = ?, created_date = ?, revision_date = ?, password_hash = ?, fingerprint = ?
+            WHERE id = ?
+        """, updates)
+        replaced = [(item_id,) for item_id in existing]
+        self.conn.executemany("DELETE FROM uris WHERE item_id = ?", replaced)
+        self.conn.executemany("DELETE FROM fields WHERE item_id = ?", replaced)
+        self.conn.executemany("INSERT INTO uris (item_id, uri, host, domain) VALUES (?, ?, ?, ?)", self.uris)
+        self.conn.executemany("INSERT INTO fields (item_id, name, value, type) VALUES (?, ?, ?, ?)", self.fields)
+        self.counts['items'] += len(self.items)
+        self.counts['uris'] += len(self.uris)
+        self.counts['fields'] += len(self.fields)
+        self.items, self.uris, self.fields = [], [], []
+        self.pending = set()
+
+    def write(self, records):
+        """Consume a parser's (kind, record) stream; one transaction for the whole import"""
+        cache_size = self.conn.execute("PRAGMA cache_size").fetchone()[0]
+        self.conn.execute(f"PRAGMA cache_size = -{IMPORT_CACHE_KIB}")
+        try:
+            for kind, record in records:
+                if kind == 'folder':
+                    self.folder(record)
+                else:
+                    self.item(record)
+            self.flush()
+            self.conn.commit()
+        finally:
+            self.conn.execute(f"PRAGMA cache_size = {int(cache_size)}")
+        return self.counts
+
+
+# Bitwarden JSON
+
+def iter_json_object(f):
+    """Stream a JSON object's (key, value) pairs; array values are yielded as
+    iterators over their elements, so large arrays are never held in memory"""
+    decoder = json.JSONDecoder()
+    state = {'buf': '', 'pos': 0, 'eof': False}
+
+    def fill():
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            state['eof'] = True
+        state['buf'] = state['buf'][state['pos']:] + chunk
+        state['pos'] = 0
+
+    def peek():
+        # Next non-whitespace character, reading more as needed
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if state['eof']:
+                return ''
+            fill()
+
+    def value():
+        peek()
+        while True:
+            try:
+                result, end = decoder.raw_decode(state['buf'], state['pos'])
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(state['buf']) or state['eof']:
+                    state['pos'] = end
+                    return result
+            except json.JSONDecodeError:
+                if state['eof']:
+                    raise
+            fill()
+
+    def expect(char):
+        if peek() != char:
+            raise ImportFormatError(f"expected {char!r} in JSON export")
+        state['pos'] += 1
+
+    def array():
+        expect('[')
+        if peek() == ']':
+            state['pos'] += 1
+            return
+        while True:
+            yield value()
+            if peek() == ',':
+                state['pos'] += 1
+                continue
+            expect(']')
+            return
+
+    expect('{')
+    if peek() == '}':
+        return
+    while True:
+        key = value()
+        expect(':')
+        if peek() == '[':
+            elements = array()
+            yield key, elements
+            for _ in elements:
+                pass  # drain whatever the caller didn't read
+        else:
+            yield key, value()
+        if peek() == ',':
+            state['pos'] += 1
+            continue
+        expect('}')
+        return
+
+
+def parse_bitwarden_json(f):
+    for key, value in iter_json_object(f):
+        if key == 'encrypted' and value:
+            raise ImportFormatError("encrypted Bitwarden exports aren't supported; export unencrypted JSON")
+        if key == 'folders':
+            for folder in value:
+                yield 'folder', {'id': folder['id'], 'name': folder['name']}
+        elif key == 'items':
+            for item in value:
+                login = item.get('login') or {}
+                yield 'item', new_item(
+                    id=item['id'],
+                    folder_id=item.get('folderId'),
+                    name=item['name'],
+                    username=login.get('username', ''),
+                    password=login.get('password', ''),
+                    notes=item.get('notes', ''),
+                    favorite=item.get('favorite', 0),
+                    reprompt=item.get('reprompt', 0),
+                    type=item.get('type', 1),
+                    created_date=item.get('creationDate'),
+                    revision_date=item.get('revisionDate'),
+                    uris=[uri.get('uri') for uri in login.get('uris') or []],
+                    fields=[(field.get('name'), field.get('value'), field.get('type'))
+                            for field in item.get('fields') or []],
+                )
+
+
+# CSV exports
+
+def parse_bitwarden_csv(f):
+    """folder,favorite,type,name,notes,fields,reprompt,login_uri,login_username,login_password,login_totp"""
+    folders = FolderNames()
+    for row in csv.DictReader(f):
+        folder_id, folder = folders.get(row.get('folder'))
+        if folder:
+            yield 'folder', folder
+        fields = []
+        for line in (row.get('fields') or '').splitlines():
+            name, _, value = line.partition(': ')
+            fields.append((name, value, FIELD_TYPE_TEXT))
+        if row.get('login_totp'):
+            fields.append(('totp', row['login_totp'], FIELD_TYPE_HIDDEN))
+        yield 'item', new_item(
+            folder_id=folder_id,
+            name=row.get('name'),
+            username=row.get('login_username') or '',
+            password=row.get('login_password') or '',
+            notes=row.get('notes') or '',
+            favorite=1 if row.get('favorite') == '1' else 0,
+            reprompt=1 if row.get('reprompt') == '1' else 0,
+            type=2 if row.get('type') == 'note' else 1,
+            uris=[uri for uri in (row.get('login_uri') or '').split(',') if uri],
+            fields=fields,
+        )
+
+
+def _epoch_ms(value):
+    try:
+        return datetime.fromtimestamp(int(value) / 1000, timezone.utc).isoformat(timespec='milliseconds')[:-6] + 'Z'
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_browser_csv(f):
+    """Chrome (name,url,username,password[,note]) and Firefox
+    (url,username,password,httpRealm,...,timeCreated,timeLastUsed,timePasswordChanged)"""
+    for row in csv.DictReader(f):
+        url = row.get('url') or ''
+        yield 'item', new_item(
+            id=(row.get('guid') or '').strip('{}') or None,
+            name=row.get('name') or normalise_host(url) or url,
+            username=row.get('username') or '',
+            password=row.get('password') or '',
+            notes=row.get('note') or '',
+            created_date=_epoch_ms(row.get('timeCreated')),
+            revision_date=_epoch_ms(row.get('timePasswordChanged')),
+            uris=[url] if url else [],
+        )
+
+
+# KeePass 2.x XML
+
+KEEPASS_STANDARD_KEYS = {'Title', 'UserName', 'Password', 'URL', 'Notes'}
+
+
+def _keepass_uuid(value):
+    try:
+        return str(uuid.UUID(bytes=base64.b64decode(value)))
+    except Exception:
+        return None
+
+
+def _keepass_time(value):
+    # KeePass 2 XML exports write ISO times; KDBX 4 internals use base64 seconds, which we skip
+    return value if value and value[:4].isdigit() and 'T' in value else None
+
+
+def parse_keepass_xml(f):
+    """KeePass 2.x "KeePass XML" export, read with iterparse; entries are
+    dropped from the tree as soon as they are written"""
+    groups = []        # [(uuid, name)] of the groups we are inside
+    path = []          # elements from the root to the current one
+    folder_ids = {}
+    for event, elem in ET.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem)
+            if elem.tag == 'Group':
+                groups.append([None, None])
+            continue
+        path.pop()
+        tag = elem.tag
+        parent = path[-1] if path else None
+        if tag in ('UUID', 'Name') and parent is not None and parent.tag == 'Group' and groups:
+            groups[-1][0 if tag == 'UUID' else 1] = elem.text
+        elif tag == 'Group':
+            groups.pop()
+            if parent is not None:
+                parent.remove(elem)
+        elif tag == 'Entry':
+            if parent is not None and parent.tag == 'History':
+                continue  # old versions of an entry, dropped with the entry itself
+            strings = {}
+            protected = set()
+            for string in elem.iterfind('String'):
+                key = string.findtext('Key')
+                value_elem = string.find('Value')
+                strings[key] = value_elem.text if value_elem is not None else None
+                if value_elem is not None and value_elem.get('Protected') == 'True':
+                    protected.add(key)
+            # Entries in the top-level group get no folder; nested groups become "A/B" folders
+            folder_id = None
+            if len(groups) > 1:
+                name = '/'.join(group[1] or '' for group in groups[1:])
+                folder_id = folder_ids.get(name)
+                if folder_id is None:
+                    folder_id = folder_ids[name] = _keepass_uuid(groups[-1][0]) or str(uuid.uuid4())
+                    yield 'folder', {'id': folder_id, 'name': name}
+            url = strings.get('URL') or ''
+            yield 'item', new_item(
+                id=_keepass_uuid(elem.findtext('UUID')),
+                folder_id=folder_id,
+                name=strings.get('Title') or normalise_host(url) or '',
+                username=strings.get('UserName') or '',
+                password=strings.get('Password') or '',
+                notes=strings.get('Notes') or '',
+                created_date=_keepass_time(elem.findtext('Times/CreationTime')),
+                revision_date=_keepass_time(elem.findtext('Times/LastModificationTime')),
+                uris=[url] if url else [],
+                fields=[(key, value, FIELD_TYPE_HIDDEN if key in protected else FIELD_TYPE_TEXT)
+                        for key, value in strings.items() if key not in KEEPASS_STANDARD_KEYS],
+            )
+            if parent is not None:
+                parent.remove(elem)
+
+
+# Format name -> (parser, open mode, description)
+IMPORTERS = {
+    'bitwarden-json': (parse_bitwarden_json, 'r', "Bitwarden JSON export (unencrypted)"),
+    'bitwarden-csv': (parse_bitwarden_csv, 'r', "Bitwarden CSV export"),
+    'browser-csv': (parse_browser_csv, 'r', "Chrome or Firefox password CSV"),
+    'keepass-xml': (parse_keepass_xml, 'rb', "KeePass 2.x XML export"),
+}
+
+
+def detect_format(path):
+    """Guess the format from the first bytes of the file"""
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        head = f.read(4096)
+    stripped = head.lstrip()
+    if stripped.startswith('{'):
+        return 'bitwarden-json'
+    if stripped.startswith('<'):
+        return 'keepass-xml'
+    header = stripped.split('\n', 1)[0]
+    if 'login_password' in header:
+        return 'bitwarden-csv'
+    if 'password' in header and 'url' in header:
+        return 'browser-csv'
+    raise ImportFormatError(f"can't tell what kind of export '{path}' is; pass a format ({', '.join(IMPORTERS)})")
+
+
+def import_file(conn, path, fmt=None, batch_size=IMPORT_BATCH_SIZE, duplicates='skip'):
+    """Stream an export file into the vault; returns the counts written.
+    `duplicates` is one of dedupe.DUPLICATE_MODES."""
+    fmt = fmt or detect_format(path)
+    if fmt not in IMPORTERS:
+        raise ImportFormatError(f"unknown format '{fmt}' (known: {', '.join(IMPORTERS)})")
+    parser, mode, _ = IMPORTERS[fmt]
+    if mode == 'rb':
+        f = open(path, 'rb')
+    else:
+        f = open(path, 'r', encoding='utf-8-sig', newline='')
+    with f:
+        try:
+            return BatchWriter(conn, batch_size, duplicates).write(parser(f))
+        except (ET.ParseError, csv.Error, ValueError, KeyError) as e:
+            conn.rollback()
+            raise ImportFormatError(f"not a valid {fmt} file: {e}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Sorted and filtered item listings
+Every sort key has a composite index in its sort order, plus a twin led by
+folder_id for folder filters. Queries name their index (INDEXED BY) so the
+planner always walks it in order and never sorts in a temp B-tree; other
+filters are checked during the walk. check-query-plans.py verifies every
+combination with EXPLAIN QUERY PLAN.
+"""
+
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from folder_tree import PATH_KEY
+
+# Sort key -> (ORDER BY columns for ascending order, default direction)
+SORTS = {
+    'favorite': (('favorite DESC', 'name', 'id'), 'asc'),  # favorites first, then by name
+    'name': (('name', 'id'), 'asc'),
+    'revised': (('revision_date', 'id'), 'desc'),  # by password age, newest first
+    'created': (('created_date', 'id'), 'desc'),
+    'folder': (None, 'asc'),  # folders in tree order, items by name within each
+}
+DEFAULT_SORT = 'favorite'
+
+# Age buckets match the dashboard's badges: (older than days, up to days)
+AGE_BUCKETS = {
+    'fresh': (None, 180),
+    'warning': (180, 365),
+    'critical': (365, None),
+}
+
+ITEMS_PAGE_SIZE = 100
+MAX_ITEMS_PAGE_SIZE = 1000
+
+
+def index_name(sort, by_folder=False):
+    return f"idx_items_{'folder_' if by_folder else ''}by_{sort}"
+
+
+def index_statements():
+    """CREATE INDEX statements behind every sort key (see vault.migrate)"""
+    statements = []
+    for sort, (columns, _) in SORTS.items():
+        if columns is None:
+            continue
+        statements.append(f"CREATE INDEX IF NOT EXISTS {index_name(sort)} ON items({', '.join(columns)})")
+        statements.append(f"CREATE INDEX IF NOT EXISTS {index_name(sort, True)} "
+                          f"ON items(folder_id, {', '.join(columns)})")
+    return statements
+
+
+def parse_listing(args):
+    """(sort, descending, filters) from query parameters; raises ValueError on bad values.
+    A 'folder' filter of None selects items outside any folder."""
+    sort = args.get('sort') or DEFAULT_SORT
+    if sort not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+    order = args.get('order') or SORTS[sort][1]
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+
+    filters = {}
+    if args.get('folder'):
+        filters['folder'] = None if args['folder'] == 'none' else args['folder']
+    if args.get('favorite'):
+        filters['favorite'] = int(args['favorite'] in ('1', 'true'))
+    if args.get('age'):
+        if args['age'] not in AGE_BUCKETS:
+            raise ValueError(f"age must be one of: {', '.join(AGE_BUCKETS)}")
+        filters['age'] = args['age']
+    if args.get('has_uri'):
+        filters['has_uri'] = args['has_uri'] in ('1', 'true')
+    if args.get('type'):
+        try:
+            filters['type'] = int(args['type'])
+        except ValueError:
+            raise ValueError("type must be a Bitwarden item type number")
+    return sort, order == 'desc', filters
+
+
+def age_cutoff(days, now=None):
+    # revision_date is ISO 8601 UTC, so a string comparison is a date comparison
+    return ((now or datetime.utcnow()) - timedelta(days=days + 1)).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def listing_query(sort, descending, filters):
+    """(sql, params) for one indexed walk over items; `sort` can't be 'folder'"""
+    where, params = [], []
+    if 'folder' in filters:
+        if filters['folder'] is None:
+            where.append("i.folder_id IS NULL")
+        else:
+            where.append("i.folder_id = ?")
+            params.append(filters['folder'])
+    if 'favorite' in filters:
+        where.append("i.favorite = ?")
+        params.append(filters['favorite'])
+    if 'age' in filters:
+        older_than, up_to = AGE_BUCKETS[filters['age']]
+        if older_than is not None:
+            where.append("i.revision_date <= ?")
+            params.append(age_cutoff(older_than))
+        if up_to is not None:
+            where.append("i.revision_date > ?")
+            params.append(age_cutoff(up_to))
+    if 'has_uri' in filters:
+        where.append(f"{'' if filters['has_uri'] else 'NOT '}EXISTS (SELECT 1 FROM uris WHERE item_id = i.id)")
+    if 'type' in filters:
+        where.append("i.type = ?")
+        params.append(filters['type'])
+
+    order_by = []
+    for column in SORTS[sort][0]:
+        name, _, direction = column.partition(' ')
+        if descending:
+            direction = 'ASC' if direction == 'DESC' else 'DESC'
+        order_by.append(f"i.{name} {direction}".rstrip())
+
+    sql = f"""
+        SELECT i.*, (SELECT uri FROM uris WHERE item_id = i.id ORDER BY id LIMIT 1) AS uri,
+               b.breach_count, f.name AS folder_path
+        FROM items i INDEXED BY {index_name(sort, 'folder' in filters)}
+        LEFT JOIN breach_results b ON b.item_id = i.id AND b.password_hash = i.password_hash
+        LEFT JOIN folders f ON f.id = i.folder_id
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY {', '.join(order_by)}
+    """
+    return sql, params
+
+
+def folder_order_query(descending):
+    return f"SELECT id FROM folders ORDER BY {PATH_KEY}{' DESC' if descending else ''}"
+
+
+def folder_order(conn, descending):
+    """Folder ids in tree order, None (no folder) first"""
+    ids = [row[0] for row in conn.execute(folder_order_query(descending))]
+    return ids + [None] if descending else [None] + ids
+
+
+def item_rows(conn, sort=DEFAULT_SORT, descending=False, filters=None, limit=None, offset=0):
+    """Item rows (with uri, breach_count and folder_path) in listing order, read lazily"""
+    filters = filters or {}
+    if sort != 'folder':
+        sql, params = listing_query(sort, descending, filters)
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        return conn.execute(sql, params)
+
+    # One index search per folder, walked in tree order
+    folder_ids = [filters['folder']] if 'folder' in filters else folder_order(conn, descending)
+
+    def rows(folder_id):
+        sql, params = listing_query('name', descending, dict(filters, folder=folder_id))
+        return conn.execute(sql, params)
+
+    all_rows = chain.from_iterable(rows(folder_id) for folder_id in folder_ids)
+    return islice(all_rows, offset, None if limit is None else offset + limit)
+
+
+def plan_problems(conn, sql, params):
+    """EXPLAIN QUERY PLAN lines showing a full table scan or a temp B-tree"""
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params):
+        detail = row[-1]
+        if 'TEMP B-TREE' in detail or (detail.startswith('SCAN') and 'INDEX' not in detail):
+            problems.append(detail)
+    return problems
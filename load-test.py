@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Load testing
+Seeds a synthetic vault, then drives a running server with N virtual
+devices replaying a mix of dashboard, search, favorite, edit and move
+requests. Reports throughput and p50/p95/p99 latency and error rate per
+route, and saves the results as JSON to compare releases.
+
+  python load-test.py seed --db loadtest.db --items 2000
+  CIPHER_WARDEN_VAULT_DIR=. python password-manager.py
+  python load-test.py run --vault loadtest --clients 20 --duration 30
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+RESULTS_DIR = 'loadtests'
+DEFAULT_PASSWORD = 'load-test-password'
+
+# Route -> share of requests a device sends
+REQUEST_MIX = {
+    'dashboard': 40,
+    'search': 25,
+    'favorite': 15,
+    'edit': 10,
+    'move': 10,
+}
+
+
+# Synthetic vault
+
+def synthetic_records(items, folders, seed=1):
+    """Folders and login items shaped like a real vault (the importers' record format)"""
+    from importers import new_item
+
+    rng = random.Random(seed)
+    folder_ids = [f'load-folder-{n}' for n in range(folders)]
+    for n, folder_id in enumerate(folder_ids):
+        yield 'folder', {'id': folder_id, 'name': f'Folder {n}'}
+    for n in range(items):
+        domain = f's{n % max(1, items // 3)}.example.com'  # some sites have several logins
+        yield 'item', new_item(
+            id=f'load-item-{n}',
+            folder_id=rng.choice(folder_ids) if folder_ids and rng.random() < 0.8 else None,
+            name=f'Site {n}',
+            username=f'user{n}@example.com',
+            password=''.join(rng.choice('abcdefghijkmnpqrstuvwxyz23456789') for _ in range(16)),
+            notes='' if rng.random() < 0.7 else 'Recovery codes in the safe',
+            favorite=1 if rng.random() < 0.05 else 0,
+            revision_date=f'20{rng.randint(19, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00.000Z',
+            uris=[f'https://{domain}/login'],
+            fields=[('pin', str(rng.randint(1000, 9999)), 1)] if rng.random() < 0.1 else [],
+        )
+
+
+def cmd_seed(args):
+    from import_bitwarden import create_database
+    from importers import BatchWriter
+
+    if os.path.exists(args.db):
+        print(f"Error: '{args.db}' already exists")
+        sys.exit(1)
+    start = time.perf_counter()
+    conn = create_database(args.db, args.password)
+    counts = BatchWriter(conn).write(synthetic_records(args.items, args.folders))
+    conn.close()
+    print(f"✓ {args.db}: {counts['items']} items in {counts['folders']} folders "
+          f"({time.perf_counter() - start:.1f}s), master password '{args.password}'")
+
+
+# Virtual devices
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Form posts answer with a redirect to the dashboard; a device wouldn't reload it every time
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def make_opener(jar):
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), NoRedirect())
+
+
+def login(url, password, vault, timeout):
+    """Cookie jar of a new session; waits out login throttling"""
+    jar = CookieJar()
+    opener = make_opener(jar)
+    form = {'password': password}
+    if vault:
+        form['vault'] = vault
+    data = urllib.parse.urlencode(form).encode()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            opener.open(url + '/login', data, timeout=30).close()
+            raise RuntimeError("login rejected (wrong password or vault?)")
+        except urllib.error.HTTPError as e:
+            if e.code == 302:
+                return jar
+            if e.code != 429 or time.monotonic() > deadline:
+                raise RuntimeError(f"login failed: HTTP {e.code}")
+            time.sleep(float(e.headers.get('Retry-After', 1)))
+
+
+def fetch_ids(opener, url, pages=2):
+    """Item and folder ids to aim requests at, from the change feed"""
+    items, folders = [], []
+    since = 0
+    for _ in range(pages):
+        with opener.open(f'{url}/api/changes?since={since}', timeout=60) as response:
+            feed = json.loads(response.read())
+        for change in feed['changes']:
+            if change['op'] == 'upsert':
+                (items if change['entity'] == 'item' else folders).append(change['id'])
+        since = feed['rev']
+        if not feed['more']:
+            break
+    return items, folders
+
+
+class Recorder:
+    """Latencies and errors per route, shared by all devices"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {route: [] for route in REQUEST_MIX}
+        self.errors = {route: {} for route in REQUEST_MIX}
+
+    def record(self, route, seconds, error=None):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if error:
+                self.errors[route][error] = self.errors[route].get(error, 0) + 1
+
+
+def device(opener, url, items, folders, recorder, stop, think, rng):
+    routes = list(REQUEST_MIX)
+    weights = [REQUEST_MIX[route] for route in routes]
+    while not stop.is_set():
+        route = rng.choices(routes, weights)[0]
+        item_id = rng.choice(items) if items else ''
+        if route == 'dashboard':
+            request = urllib.request.Request(url + '/dashboard')
+        elif route == 'search':
+            n = rng.randint(0, 999)
+            request = urllib.request.Request(f'{url}/api/match?url=https://s{n}.example.com/')
+        elif route == 'favorite':
+            request = urllib.request.Request(url + '/toggle_favorite',
+                                             json.dumps({'item_id': item_id, 'favorite': rng.random() < 0.5}).encode(),
+                                             {'Content-Type': 'application/json'})
+        elif route == 'edit':
+            form = {'item_id': item_id, 'name': f'Edited {rng.randint(0, 1 << 30)}', 'username': 'load@example.com',
+                    'password': f'pw-{rng.randint(0, 1 << 30)}', 'notes': '', 'url': 'https://edited.example.com',
+                    'folder_id': rng.choice(folders) if folders else ''}
+            request = urllib.request.Request(url + '/edit_item', urllib.parse.urlencode(form).encode())
+        else:
+            form = {'item_id': item_id, 'folder_id': rng.choice(folders) if folders else ''}
+            request = urllib.request.Request(url + '/move_item', urllib.parse.urlencode(form).encode())
+
+        start = time.perf_counter()
+        error = None
+        try:
+            with opener.open(request, timeout=60) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            e.read()
+            # Writes answer with a redirect back to the dashboard: success
+            if not (e.code == 302 and e.headers.get('Location', '').endswith('/dashboard')):
+                error = f'HTTP {e.code}'
+        except (urllib.error.URLError, OSError) as e:
+            error = type(e).__name__
+        recorder.record(route, time.perf_counter() - start, error)
+        if think:
+            stop.wait(rng.uniform(0, 2 * think))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+def summarise(recorder, duration):
+    routes = {}
+    for route, latencies in recorder.latencies.items():
+        latencies = sorted(latencies)
+        errors = sum(recorder.errors[route].values())
+        routes[route] = {
+            'requests': len(latencies),
+            'per_second': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            'error_rate': round(errors / len(latencies), 4) if latencies else 0,
+            'errors': recorder.errors[route],
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {'requests': total, 'per_second': round(total / duration, 1), 'routes': routes}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(result, baseline=None):
+    print(f"\n{'Route':10} {'Req':>7} {'Req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Errors':>7}")
+    print("-" * 62)
+    for route, stats in result['summary']['routes'].items():
+        def ms(key):
+            return f"{stats[key]:8.1f}" if stats[key] is not None else f"{'-':>8}"
+        line = (f"{route:10} {stats['requests']:>7} {stats['per_second']:>7.1f} {ms('p50_ms')} {ms('p95_ms')} "
+                f"{ms('p99_ms')} {stats['error_rate']:>7.1%}")
+        old = baseline and baseline['summary']['routes'].get(route)
+        if old and old.get('p95_ms') and stats['p95_ms']:
+            line += f"   p95 {(stats['p95_ms'] / old['p95_ms'] - 1):+.0%} vs {baseline.get('revision') or 'baseline'}"
+        print(line)
+    print("-" * 62)
+    summary = result['summary']
+    print(f"{'total':10} {summary['requests']:>7} {summary['per_second']:>7.1f}")
+
+
+def cmd_run(args):
+    url = args.url.rstrip('/')
+    print(f"Logging in {args.sessions} session(s) to {url}...")
+    jars = [login(url, args.password, args.vault, args.login_timeout) for _ in range(args.sessions)]
+    items, folders = fetch_ids(make_opener(jars[0]), url)
+    if not items:
+        print("Error: the vault has no items to aim requests at (seed one with 'load-test.py seed')")
+        sys.exit(1)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = []
+    for n in range(args.clients):
+        # Devices share the sessions round-robin: the server throttles repeated logins from one address
+        jar = CookieJar()
+        for cookie in jars[n % len(jars)]:
+            jar.set_cookie(cookie)
+        thread = threading.Thread(target=device, name=f'device-{n}', daemon=True,
+                                  args=(make_opener(jar), url, items, folders, recorder, stop, args.think,
+                                        random.Random(n)))
+        threads.append(thread)
+
+    print(f"Running {args.clients} devices for {args.duration}s...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    result = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'url': url,
+        'clients': args.clients,
+        'sessions': args.sessions,
+        'think_seconds': args.think,
+        'duration_seconds': round(duration, 1),
+        'mix': REQUEST_MIX,
+        'summary': summarise(recorder, duration),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.clients}clients.json")
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSaved {path} (compare later runs with --compare {path})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic vault and load-test a running server")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('seed', help="create a synthetic vault")
+    p.add_argument('--db', default='loadtest.db')
+    p.add_argument('--items', type=int, default=2000)
+    p.add_argument('--folders', type=int, default=20)
+    p.add_argument('--password', default=DEFAULT_PASSWORD)
+    p.set_defaults(func=cmd_seed)
+
+    p = sub.add_parser('run', help="drive a running server with virtual devices")
+    p.add_argument('--url', default='http://127.0.0.1:5000')
+    p.add_argument('--vault', help="vault to log in to (default: the server's default vault)")
+    p.add_argument('--password', default=DEFAULT_PASSWORD)
+    p.add_argument('--clients', type=int, default=10, help="concurrent virtual devices")
+    p.add_argument('--sessions', type=int, default=1, help="separate logins shared by the devices")
+    p.add_argument('--duration', type=float, default=30, help="seconds to run")
+    p.add_argument('--think', type=float, default=0.5, help="mean pause between a device's requests (seconds)")
+    p.add_argument('--login-timeout', type=float, default=120, help="how long to wait out login throttling")
+    p.add_argument('--results-dir', default=RESULTS_DIR)
+    p.add_argument('--compare', help="earlier results file to compare p95 latency against")
+    p.set_defaults(func=cmd_run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Login throttling
+Every unlock attempt costs a full SQLCipher key derivation, so attempts are
+rate limited per client and globally before they ever reach SQLCipher
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`"""
+
+    def __init__(self, rate, capacity, now=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class ClientState:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.failures = 0
+        self.blocked_until = 0
+
+
+class LoginLimiter:
+    """Per-client and global token buckets, failure backoff and a cap on concurrent KDFs"""
+
+    def __init__(self, client_rate=0.1, client_burst=5, global_rate=1.0, global_burst=10,
+                 max_concurrent_kdf=2, backoff_base=1.0, backoff_max=300.0, max_clients=1024):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_clients = max_clients
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.kdf_slots = threading.BoundedSemaphore(max_concurrent_kdf)
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _client(self, client, now):
+        state = self.clients.get(client)
+        if state is None:
+            state = ClientState(TokenBucket(self.client_rate, self.client_burst, now))
+            self.clients[client] = state
+            # Forget the least recently seen clients so memory stays bounded
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client)
+        return state
+
+    def acquire(self, client):
+        """Ask to run one unlock attempt; returns (allowed, retry_after_seconds)"""
+        # Claim the KDF slot first so a busy server doesn't use up the client's tokens
+        if not self.kdf_slots.acquire(blocking=False):
+            return False, 1.0
+        now = time.monotonic()
+        with self.lock:
+            state = self._client(client, now)
+            if state.blocked_until > now:
+                wait = state.blocked_until - now
+            else:
+                wait = state.bucket.take(now)
+                if not wait:
+                    wait = self.global_bucket.take(now)
+                    if wait:
+                        state.bucket.give_back()
+        if wait:
+            self.kdf_slots.release()
+            return False, wait
+        return True, 0
+
+    def release(self, client, success):
+        """Finish an attempt started with acquire() and record its outcome
+        (success=None: the attempt never got a verdict and isn't counted)"""
+        self.kdf_slots.release()
+        if success is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            state = self._client(client, now)
+            if success:
+                state.failures = 0
+                state.blocked_until = 0
+            else:
+                state.failures += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (state.failures - 1))
+                state.blocked_until = now + delay
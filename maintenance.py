@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Background vault maintenance
+Runs PRAGMA optimize, ANALYZE, incremental vacuum, WAL checkpoints,
+integrity checks and change journal compaction while the server is idle,
+in short steps so a device that starts writing never waits long for the lock
+"""
+
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+from changes import compact_journal
+from vault import checkpoint, open_vault
+
+MAINTENANCE_IDLE_SECONDS = 30   # quiet time required before running anything
+MAINTENANCE_TICK = 10           # how often the scheduler looks for due tasks
+VACUUM_STEP_PAGES = 64          # pages freed per incremental_vacuum transaction
+VACUUM_BUDGET_SECONDS = 2.0     # total time one vacuum run may take
+ANALYSIS_LIMIT = 400            # rows sampled per index by ANALYZE
+
+# Task name -> interval in seconds
+MAINTENANCE_TASKS = {
+    'checkpoint': 5 * 60,
+    'optimize': 60 * 60,
+    'incremental_vacuum': 6 * 60 * 60,
+    'analyze': 24 * 60 * 60,
+    'integrity_check': 24 * 60 * 60,
+    'compact_journal': 24 * 60 * 60,
+}
+
+
+class MaintenanceScheduler:
+    """Runs due maintenance tasks whenever the server has been idle for a while"""
+
+    def __init__(self, db_path, guard=None, tasks=None, idle_seconds=MAINTENANCE_IDLE_SECONDS):
+        self.db_path = db_path
+        # Context manager factory held around each step (used to keep the memory replica in sync)
+        self.guard = guard or nullcontext
+        self.tasks = dict(tasks or MAINTENANCE_TASKS)
+        self.idle_seconds = idle_seconds
+        self.key = None
+        self.conn = None
+        self.last_activity = time.monotonic()
+        self.due = {name: 0 for name in self.tasks}
+        self.results = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def arm(self, key):
+        """Maintenance needs the key; start after the first unlock"""
+        with self.lock:
+            self.key = key
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, name='maintenance', daemon=True)
+                self.thread.start()
+
+    def touch(self):
+        """Record request activity; tasks wait until things are quiet again"""
+        self.last_activity = time.monotonic()
+
+    def idle(self):
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def stop(self):
+        """End the schedule (the vault is being unloaded) after the current task"""
+        self.stopped.set()
+
+    def _loop(self):
+        while not self.stopped.wait(MAINTENANCE_TICK):
+            for name in self.tasks:
+                if not self.idle() or self.stopped.is_set():
+                    break
+                if time.monotonic() >= self.due[name]:
+                    self.run_task(name)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def run_task(self, name):
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = open_vault(self.key, self.db_path, check_same_thread=False)
+            result = getattr(self, '_' + name)()
+            error = None
+        except Exception as e:
+            result = None
+            error = str(e)
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+        self.due[name] = time.monotonic() + self.tasks[name]
+        self.results[name] = {
+            'last_run': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'result': result,
+            'error': error,
+        }
+
+    def _checkpoint(self):
+        with self.guard():
+            busy, wal_pages, done = checkpoint(self.conn, 'PASSIVE')
+        return {'wal_pages': wal_pages, 'checkpointed': done}
+
+    def _optimize(self):
+        with self.guard():
+            self.conn.execute("PRAGMA optimize")
+            self.conn.commit()
+        return 'ok'
+
+    def _analyze(self):
+        # analysis_limit samples each index instead of reading it all
+        with self.guard():
+            self.conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            self.conn.execute("ANALYZE")
+            self.conn.commit()
+        return 'ok'
+
+    def _incremental_vacuum(self):
+        auto_vacuum = self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if auto_vacuum != 2:
+            # Only vaults created with auto_vacuum = INCREMENTAL can shrink in steps;
+            # older ones need a one-off `cipher-warden vacuum`
+            return {'free_pages': free, 'freed': 0, 'note': 'run cipher-warden vacuum once'}
+        freed = 0
+        deadline = time.perf_counter() + VACUUM_BUDGET_SECONDS
+        while free and self.idle() and time.perf_counter() < deadline:
+            with self.guard():
+                self.conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+                self.conn.commit()
+            remaining = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            freed += free - remaining
+            if remaining >= free:
+                break
+            free = remaining
+        return {'free_pages': free, 'freed': freed}
+
+    def _integrity_check(self):
+        # Read-only; in WAL mode this doesn't block writers
+        return self.conn.execute("PRAGMA quick_check").fetchone()[0]
+
+    def _compact_journal(self):
+        # One short transaction per rev range, stopping as soon as a request comes in
+        removed = 0
+        steps = compact_journal(self.conn)
+        while self.idle():
+            with self.guard():
+                step = next(steps, None)
+            if step is None:
+                return {'removed': removed, 'finished': True}
+            removed += step
+        steps.close()
+        return {'removed': removed, 'finished': False}
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'armed': self.thread is not None,
+            'idle': self.idle(),
+            'tasks': {
+                name: dict(self.results.get(name, {}),
+                           next_in_seconds=max(0, round(self.due[name] - now)) if self.thread else None)
+                for name in self.tasks
+            },
+        }
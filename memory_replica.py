@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+In-memory read replica of the vault
+Optional mode: after unlock the vault is decrypted with sqlcipher_export into
+a shared-cache in-memory SQLite database, and SELECTs are served from it,
+skipping SQLCipher's per-page decryption and HMAC checks. Every read gets its
+own connection to the copy, so reads never wait for each other. Writes go to
+the encrypted file first and are replayed here under the replica lock, which
+is only held for that replay and for swapping copies.
+"""
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from vault import USE_SQLCIPHER, key_literal, load_cipher_settings, quote, sqlcipher
+
+REPLICA_IDLE_TIMEOUT = 15 * 60  # seconds without reads before the copy is dropped
+
+
+def file_stamp(db_path):
+    """Cheap fingerprint of the vault file and its WAL, to notice outside writers"""
+    stamp = []
+    for path in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+# Names of the in-memory databases; a new copy never shares a name with an old one
+# that readers may still hold open
+REPLICA_NAMES = itertools.count()
+
+
+class MemoryReplica:
+    def __init__(self, enabled=False, idle_timeout=REPLICA_IDLE_TIMEOUT):
+        # Without SQLCipher there is nothing to decrypt (and no sqlcipher_export)
+        self.enabled = enabled and USE_SQLCIPHER
+        self.idle_timeout = idle_timeout
+        self.lock = threading.RLock()
+        self.conn = None  # replays go through this one; it also keeps the copy alive
+        self.uri = None
+        self.db_path = None
+        self.stamp = None
+        self.last_used = 0
+        self.loaded_at = None
+        self.load_seconds = None
+        self.sweeper = None
+        self.closed = False
+
+    def load(self, db_path, key):
+        """Decrypt the vault file into a new in-memory copy and swap it in"""
+        start = time.perf_counter()
+        uri = f"file:cipher-warden-replica-{next(REPLICA_NAMES)}?mode=memory&cache=shared"
+        replica = sqlcipher.connect(uri, uri=True, check_same_thread=False)
+        try:
+            settings = load_cipher_settings(db_path)
+            replica.execute(f"ATTACH DATABASE {quote(db_path)} AS vault KEY {key_literal(key)}")
+            replica.execute("PRAGMA vault.cipher_compatibility = 4")
+            replica.execute(f"PRAGMA vault.kdf_iter = {int(settings['kdf_iter'])}")
+            replica.execute(f"PRAGMA vault.cipher_page_size = {int(settings['cipher_page_size'])}")
+            replica.execute("SELECT sqlcipher_export('main', 'vault')")
+            replica.execute("DETACH DATABASE vault")
+        except Exception:
+            replica.close()
+            raise
+
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = replica
+            self.uri = uri
+            self.db_path = db_path
+            self.stamp = file_stamp(db_path)
+            self.last_used = time.monotonic()
+            self.loaded_at = time.time()
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep, name='replica-sweeper', daemon=True)
+                self.sweeper.start()
+
+    def drop(self):
+        """Forget the decrypted copy (logout, idle timeout, outside change); it is freed
+        once the last reader closes its connection"""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            self.uri = None
+            self.stamp = None
+
+    def close(self):
+        """Drop the copy for good and let the sweeper thread exit"""
+        self.closed = True
+        self.drop()
+
+    def connect(self):
+        """A new read-only connection to the copy (the caller closes it), or None if there is
+        no copy or it may be out of date"""
+        if not self.enabled:
+            return None
+        uri, stamp = self.uri, self.stamp
+        if uri is None:
+            return None
+        if file_stamp(self.db_path) != stamp:
+            # Either a write is being replayed right now (read the file this once) or
+            # someone else (CLI, importer, another process) wrote to the file
+            if self.lock.acquire(blocking=False):
+                try:
+                    if self.uri == uri and file_stamp(self.db_path) != self.stamp:
+                        self.drop()
+                finally:
+                    self.lock.release()
+            return None
+        conn = sqlcipher.connect(uri, uri=True, check_same_thread=False)
+        # Don't take table read locks, which would make a replay fail with SQLITE_LOCKED;
+        # a read may see a replay half done, of a write the file has already committed
+        conn.execute("PRAGMA read_uncommitted = 1")
+        conn.row_factory = sqlcipher.Row
+        self.last_used = time.monotonic()
+        return conn
+
+    @contextmanager
+    def borrow(self):
+        """connect() as a context manager that always closes the connection"""
+        conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def writing(self):
+        """Hold the replica lock across a write to the file and its replay here,
+        so replays happen in the order the file committed them"""
+        with self.lock:
+            yield
+
+    @contextmanager
+    def external_write(self):
+        """For writes that can't be replayed here (maintenance): keep the replica
+        only if the file hadn't already been changed by someone else"""
+        with self.lock:
+            fresh = self.conn is not None and file_stamp(self.db_path) == self.stamp
+            yield
+            if fresh:
+                self.stamp = file_stamp(self.db_path)
+
+    def apply(self, statements):
+        """Replay statements the vault file has already committed (call inside writing())"""
+        if self.conn is None:
+            return
+        try:
+            for sql, params in statements:
+                self.conn.execute(sql, params)
+            self.conn.commit()
+            self.stamp = file_stamp(self.db_path)
+        except Exception as e:
+            # Never serve a replica that may have diverged from the file; the file has the
+            # write, so the request still succeeds and reads go to the file until the next load
+            print(f"Memory replica dropped: replaying a write failed ({e})")
+            self.drop()
+
+    def _sweep(self):
+        while not self.closed:
+            time.sleep(min(60, self.idle_timeout))
+            with self.lock:
+                if self.conn is not None and time.monotonic() - self.last_used > self.idle_timeout:
+                    self.drop()
+
+    def status(self):
+        return {
+            'enabled': self.enabled,
+            'loaded': self.conn is not None,
+            'load_seconds': self.load_seconds,
+        }
@@ -5,43 +5,181 @@ Local Password Manager Web Interface
 Access your encrypted Bitwarden data via web browser
 """
 
-from flask import Flask, render_template_string, request, session, redirect, url_for, jsonify
-from pysqlcipher3 import dbapi2 as sqlcipher
+import time
+
+# Everything below is timed so startup regressions show up in the launch banner
+LAUNCH_TIME = time.perf_counter()
+
+from flask import (Flask, Response, g, render_template, request, session, redirect, url_for, jsonify,
+                   make_response, stream_with_context)
+from jinja2 import DictLoader
+import gzip
 import secrets
+import math
 import os
+import threading
 import uuid
 import string
 from datetime import timedelta, datetime
 from functools import wraps
+from itertools import islice
+
+from login_limiter import LoginLimiter
+from unlock_pool import UnlockPool, UnlockPoolFull, UnlockTimeout
+from changes import CHANGES_PAGE_SIZE, changes_since
+from export_bitwarden import iter_bitwarden_json
+from folder_tree import child_folders
+from item_query import ITEMS_PAGE_SIZE, MAX_ITEMS_PAGE_SIZE, item_rows, parse_listing
+from profiler import PROFILE_DIR, RequestProfiler
+from session_store import SESSION_MAX_AGE, SessionStore
+from sync import PeerClient, SyncError, pull
+from uri_match import match_rank, uri_parts
+from vaults import VAULT_DIR, VaultRegistry
+from vault import get_hmac_key, is_locked_error, item_fingerprint, password_hash, sqlcipher
+
+IMPORT_SECONDS = time.perf_counter() - LAUNCH_TIME
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(32)
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=300)
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=SESSION_MAX_AGE)
+
+PORT = int(os.environ.get('CIPHER_WARDEN_PORT', 5000))
+
+# Unlock attempts each cost a full KDF: they run on a small dedicated pool,
+# and the limiter only admits as many as the pool can hold
+UNLOCK_POOL = UnlockPool()
+LOGIN_LIMITER = LoginLimiter(max_concurrent_kdf=UNLOCK_POOL.workers + UNLOCK_POOL.max_queue)
+
+# Logged-in sessions: the cookie holds an opaque ID, the vault's raw key stays here
+# (derived once at login; the master password itself is not kept)
+SESSIONS = SessionStore()
+
+# Opt-in request profiling: every request with CIPHER_WARDEN_PROFILE=1, or logged-in
+# requests sending "X-Profile: 1"; profiles go to ./profiles/<route>/
+PROFILER = RequestProfiler(os.environ.get('CIPHER_WARDEN_PROFILE_DIR', PROFILE_DIR),
+                           always=os.environ.get('CIPHER_WARDEN_PROFILE') == '1')
 
-DB_PATH = 'passwords.db'
+# Every *.db file in CIPHER_WARDEN_VAULT_DIR can be unlocked; each loaded vault has its own
+# memory replica (CIPHER_WARDEN_MEMORY_REPLICA=1), write lock, daily backups into ./backups
+# and idle-time maintenance, and is unloaded again after 30 idle minutes
+VAULTS = VaultRegistry(os.environ.get('CIPHER_WARDEN_VAULT_DIR', VAULT_DIR),
+                       replica_enabled=os.environ.get('CIPHER_WARDEN_MEMORY_REPLICA') == '1')
+
+# Compress /api/changes pages bigger than this when the peer accepts gzip
+GZIP_MIN_BYTES = 1024
+
+# POST /api/sync logs in with a master password, so it only talks to these instances
+# (comma-separated URLs in CIPHER_WARDEN_PEERS)
+SYNC_PEERS = {url.strip().rstrip('/') for url in os.environ.get('CIPHER_WARDEN_PEERS', '').split(',') if url.strip()}
 
 # Session timeout decorator
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'authenticated' not in session:
+        unlocked = SESSIONS.get(session.get('sid'))
+        vault = VAULTS.get(unlocked[0]) if unlocked else None
+        if vault is None:
+            session.clear()
             return redirect(url_for('login'))
+        g.vault = vault
+        g.db_key = unlocked[1]
+        vault.touch(g.db_key)
         return f(*args, **kwargs)
     return decorated_function
 
 
-def get_db_connection(password):
-    """Connect to encrypted database"""
-    try:
-        conn = sqlcipher.connect(DB_PATH)
-        conn.execute(f"PRAGMA key = '{password}'")
-        conn.execute("PRAGMA cipher_compatibility = 4")
-        # Test connection by running a simple query
-        conn.execute("SELECT COUNT(*) FROM folders")
-        conn.row_factory = sqlcipher.Row
-        return conn
-    except Exception as e:
-        return None
+# Routes answer 503 when the vault is still locked: opening it (LoadedVault.connect raises
+# lock errors rather than fail the login check) or after LoadedVault.write's retries
+def busy_on_locked(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        except sqlcipher.OperationalError as e:
+            if not is_locked_error(e):
+                raise
+        response = jsonify({'error': 'Vault is busy, please try again'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    return decorated_function
+
+
+def get_db_connection(key):
+    """Connect to the request's encrypted vault (closed when the request ends at the latest)"""
+    conn = g.vault.connect(key)
+    if conn:
+        g.setdefault('connections', []).append(conn)
+    return conn
+
+
+def get_read_connection(key):
+    """Connection for SELECTs: the memory replica when enabled, else the vault file"""
+    conn = g.vault.read_connection(key)
+    if conn:
+        g.setdefault('connections', []).append(conn)
+    return conn
+
+
+def run_write(conn, writes):
+    """Commit (sql, params) writes to the vault file, then replay them on the replica"""
+    g.vault.write(conn, writes)
+
+
+# Bitwarden custom field types
+FIELD_TYPE_HIDDEN = 1
+FIELD_TYPE_BOOLEAN = 2
+FIELD_TYPE_LINKED = 3
+
+# Item ids per batched fields query (stays under SQLite's bound-parameter limit)
+FIELDS_BATCH_SIZE = 500
+
+# Template output events joined into one chunk of a streamed page (a few items' worth of HTML)
+STREAM_BUFFER = 500
+
+
+def fetch_fields(conn, item_ids):
+    """Custom fields for many items, one IN (...) query per batch; returns {item_id: [field, ...]}"""
+    fields = {}
+    item_ids = list(item_ids)
+    for start in range(0, len(item_ids), FIELDS_BATCH_SIZE):
+        batch = item_ids[start:start + FIELDS_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor = conn.execute(f"""
+            SELECT item_id, name, value, type
+            FROM fields
+            WHERE item_id IN ({placeholders})
+            ORDER BY item_id, id
+        """, batch)
+        for row in cursor:
+            fields.setdefault(row['item_id'], []).append(
+                {'name': row['name'], 'value': row['value'], 'type': row['type']})
+    return fields
+
+
+def iter_dashboard_items(conn, rows):
+    """Dashboard items (item_query rows) with their age and custom fields, read lazily in batches"""
+    rows = iter(rows)
+    while True:
+        rows_batch = list(islice(rows, FIELDS_BATCH_SIZE))
+        if not rows_batch:
+            break
+        # Custom fields for the batch in one query (never one query per item)
+        fields = fetch_fields(conn, (row['id'] for row in rows_batch))
+        for row in rows_batch:
+            item = dict(row)
+            item['age_days'] = calculate_password_age(row['revision_date'])
+            item['age_warning'] = get_age_warning(item['age_days'])
+            item['fields'] = fields.get(row['id'], [])
+            yield item
+
+
+def stream_template(template_name, **context):
+    """Render a template piece by piece, flushing every STREAM_BUFFER template events"""
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+    return stream
 
 
 def calculate_password_age(revision_date):
@@ -112,7 +250,7 @@ LOGIN_TEMPLATE = """
             color: #555;
             font-weight: 500;
         }
-        input[type="password"] {
+        input[type="password"], select {
             width: 100%;
             padding: 12px;
             border: 2px solid #e0e0e0;
@@ -163,6 +301,16 @@ LOGIN_TEMPLATE = """
         <div class="error">{{ error }}</div>
         {% endif %}
         <form method="POST">
+            {% if vaults|length > 1 %}
+            <div class="form-group">
+                <label for="vault">Vault</label>
+                <select id="vault" name="vault">
+                    {% for name in vaults %}
+                    <option value="{{ name }}" {% if name == selected %}selected{% endif %}>{{ name }}</option>
+                    {% endfor %}
+                </select>
+            </div>
+            {% endif %}
             <div class="form-group">
                 <label for="password">Master Password</label>
                 <input type="password" id="password" name="password" autofocus required>
@@ -247,6 +395,19 @@ MAIN_TEMPLATE = """
             border-radius: 6px;
             font-size: 16px;
         }
+        .listing {
+            display: flex;
+            flex-wrap: wrap;
+            gap: 10px;
+            align-items: center;
+            margin-top: 10px;
+            font-size: 14px;
+        }
+        .listing select {
+            padding: 6px;
+            border: 2px solid #e0e0e0;
+            border-radius: 6px;
+        }
         .search-box input:focus {
             outline: none;
             border-color: #667eea;
@@ -272,6 +433,11 @@ MAIN_TEMPLATE = """
             border-color: #667eea;
             background: #f0f4ff;
         }
+        .folder-toggle {
+            display: inline-block;
+            width: 1.2em;
+            color: #667eea;
+        }
         .folder-btn .count {
             color: #999;
             font-size: 12px;
@@ -570,23 +736,64 @@ MAIN_TEMPLATE = """
     <div class="container">
         <div class="search-box">
             <input type="text" id="searchInput" placeholder="🔍 Search passwords..." onkeyup="filterItems()">
+            <form class="listing" method="get" action="{{ url_for('dashboard') }}">
+                <select name="sort" onchange="this.form.submit()">
+                    {% for key, label in [('favorite', 'Favorites first'), ('name', 'Name'), ('revised', 'Recently changed'),
+                                          ('created', 'Recently created'), ('folder', 'Folder')] %}
+                    <option value="{{ key }}"{% if key == sort %} selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+                <select name="order" onchange="this.form.submit()">
+                    {% for key, label in [('', 'Default order'), ('asc', 'Ascending'), ('desc', 'Descending')] %}
+                    <option value="{{ key }}"{% if key == order %} selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+                <select name="folder" onchange="this.form.submit()">
+                    <option value="">All folders</option>
+                    <option value="none"{% if 'folder' in filters and filters.folder is none %} selected{% endif %}>No folder</option>
+                    {% for folder in folders %}
+                    <option value="{{ folder.id }}"{% if folder.id == filters.get('folder') %} selected{% endif %}>{{ folder.name }}</option>
+                    {% endfor %}
+                </select>
+                <select name="type" onchange="this.form.submit()">
+                    {% for key, label in [('', 'Any type'), (1, 'Logins'), (2, 'Secure notes'), (3, 'Cards'), (4, 'Identities')] %}
+                    <option value="{{ key }}"{% if key == filters.get('type', '') %} selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+                <select name="has_uri" onchange="this.form.submit()">
+                    {% for key, label in [('', 'With or without URI'), ('1', 'With a URI'), ('0', 'Without a URI')] %}
+                    <option value="{{ key }}"{% if (key == '' and 'has_uri' not in filters) or (key and 'has_uri' in filters and filters.has_uri == (key == '1')) %} selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+                <select name="age" onchange="this.form.submit()">
+                    {% for key, label in [('', 'Any age'), ('fresh', 'Under 6 months'), ('warning', '6-12 months'),
+                                          ('critical', 'Over a year')] %}
+                    <option value="{{ key }}"{% if key == filters.age or (not key and not filters.age) %} selected{% endif %}>{{ label }}</option>
+                    {% endfor %}
+                </select>
+                <label><input type="checkbox" name="favorite" value="1" onchange="this.form.submit()"
+                              {% if filters.favorite %}checked{% endif %}> Favorites only</label>
+            </form>
         </div>
 
         <div class="folders">
-            <button class="folder-btn active" onclick="filterByFolder(null, this)">
+            <button class="folder-btn{% if 'folder' not in filters %} active{% endif %}" onclick="showFolder(null)">
                 📁 All Items
                 <div class="count">{{ total_items }} items</div>
             </button>
-            {% for folder in folders %}
-            <button class="folder-btn" onclick="filterByFolder('{{ folder.id }}', this)">
+            {% for folder in folder_tree %}
+            {# Folders that only exist as a path prefix ("A" of "A/B") have no items of their own: they just expand #}
+            <button class="folder-btn{% if folder.id and folder.id == filters.get('folder') %} active{% endif %}"
+                    data-path="{{ folder.path }}" data-id="{{ folder.id or '' }}" data-depth="0"
+                    onclick="{% if folder.id %}showFolder(this.dataset.id){% else %}toggleFolder(event, this){% endif %}">
+                {% if folder.children %}<span class="folder-toggle" onclick="toggleFolder(event, this.parentElement)">▸</span>{% endif %}
                 📂 {{ folder.name }}
-                <div class="count">{{ folder.count }} items</div>
+                <div class="count">{{ folder.items }} items{% if folder.total != folder.items %} ({{ folder.total }} with subfolders){% endif %}</div>
             </button>
             {% endfor %}
         </div>
 
         <div class="items" id="itemsList">
-            {% if items %}
                 {% for item in items %}
                 {% set age_days = item.age_days %}
                 {% set age_warning = item.age_warning %}
@@ -603,6 +810,11 @@ MAIN_TEMPLATE = """
                      data-item-notes="{{ (item.notes or '')|e }}"
                      data-item-favorite="{{ item.favorite }}">
 
+                    {% if item.breach_count %}
+                    <div class="age-badge critical" title="Found in a breached-password list">
+                        🚨 Breached ({{ item.breach_count }}×)
+                    </div>
+                    {% endif %}
                     {% if age_warning %}
                     <div class="age-badge {{ age_warning }}">
                         {% if age_warning == 'critical' %}
@@ -648,20 +860,35 @@ MAIN_TEMPLATE = """
                             <button type="button" class="copy-btn" data-copy-text="{{ item.password|e }}">Copy</button>
                         </div>
                         {% endif %}
+
+                        {% for field in item.fields %}
+                        <div class="cred-row">
+                            <span class="cred-label">{{ field.name or 'Field' }}</span>
+                            {% if field.type == FIELD_TYPE_BOOLEAN %}
+                            <span class="cred-value">{% if field.value == 'true' %}✓{% else %}✗{% endif %}</span>
+                            {% elif field.type == FIELD_TYPE_LINKED %}
+                            <span class="cred-value">(linked)</span>
+                            {% else %}
+                            <span class="cred-value{% if field.type == FIELD_TYPE_HIDDEN %} password{% endif %}"{% if field.type == FIELD_TYPE_HIDDEN %} title="Click to reveal"{% endif %}>{{ field.value or '' }}</span>
+                            {% if field.value %}
+                            <button type="button" class="copy-btn" data-copy-text="{{ field.value|e }}">Copy</button>
+                            {% endif %}
+                            {% endif %}
+                        </div>
+                        {% endfor %}
                     </div>
 
                     {% if item.notes %}
                     <div class="notes">{{ item.notes }}</div>
                     {% endif %}
                 </div>
-                {% endfor %}
-            {% else %}
+                {% else %}
                 <div class="empty-state">
                     <div class="empty-state-icon">🔍</div>
                     <h2>No passwords found</h2>
                     <p>Try a different search or folder</p>
                 </div>
-            {% endif %}
+                {% endfor %}
         </div>
     </div>
 
@@ -802,13 +1029,68 @@ MAIN_TEMPLATE = """
             });
         }
 
-        let currentFolder = null;
+        const currentFolder = {{ filters.get('folder', '')|tojson }};
 
-        function filterByFolder(folderId, btn) {
-            currentFolder = folderId;
-            document.querySelectorAll('.folder-btn').forEach(b => b.classList.remove('active'));
-            btn.classList.add('active');
-            filterItems();
+        // Folders are filtered on the server: reload with ?folder=<id>, keeping the other listing controls
+        function showFolder(folderId) {
+            const params = new URLSearchParams(window.location.search);
+            if (folderId) {
+                params.set('folder', folderId);
+            } else {
+                params.delete('folder');
+            }
+            window.location.search = params.toString();
+        }
+
+        function folderButton(node, depth) {
+            const btn = document.createElement('button');
+            btn.className = 'folder-btn';
+            btn.dataset.path = node.path;
+            btn.dataset.id = node.id || '';
+            btn.dataset.depth = depth;
+            btn.style.marginLeft = (depth * 16) + 'px';
+            if (node.id && node.id === currentFolder) btn.classList.add('active');
+            btn.onclick = node.id ? () => showFolder(node.id) : (event) => toggleFolder(event, btn);
+            if (node.children) {
+                const toggle = document.createElement('span');
+                toggle.className = 'folder-toggle';
+                toggle.textContent = '▸';
+                toggle.onclick = (event) => toggleFolder(event, btn);
+                btn.appendChild(toggle);
+            }
+            btn.appendChild(document.createTextNode(' 📂 ' + node.name));
+            const count = document.createElement('div');
+            count.className = 'count';
+            count.textContent = node.items + ' items' +
+                (node.total !== node.items ? ' (' + node.total + ' with subfolders)' : '');
+            btn.appendChild(count);
+            return btn;
+        }
+
+        async function toggleFolder(event, btn) {
+            event.stopPropagation();
+            const path = btn.dataset.path;
+            const toggle = btn.querySelector('.folder-toggle');
+            if (btn.dataset.expanded) {
+                document.querySelectorAll('.folder-btn').forEach(b => {
+                    if (b.dataset.path && b.dataset.path.startsWith(path + '/')) b.remove();
+                });
+                delete btn.dataset.expanded;
+                toggle.textContent = '▸';
+                return;
+            }
+            const response = await fetch('/api/folders?parent=' + encodeURIComponent(path));
+            if (!response.ok) return;
+            const data = await response.json();
+            const depth = parseInt(btn.dataset.depth) + 1;
+            let after = btn;
+            data.folders.forEach(node => {
+                const child = folderButton(node, depth);
+                after.after(child);
+                after = child;
+            });
+            btn.dataset.expanded = '1';
+            toggle.textContent = '▾';
         }
 
         function filterItems() {
@@ -819,12 +1101,8 @@ MAIN_TEMPLATE = """
             items.forEach(item => {
                 const name = item.dataset.name;
                 const username = item.dataset.username;
-                const folder = item.dataset.folder;
-
-                const matchesSearch = name.includes(searchTerm) || username.includes(searchTerm);
-                const matchesFolder = !currentFolder || folder === currentFolder;
 
-                if (matchesSearch && matchesFolder) {
+                if (name.includes(searchTerm) || username.includes(searchTerm)) {
                     item.style.display = 'block';
                     visibleCount++;
                 } else {
@@ -997,95 +1275,209 @@ MAIN_TEMPLATE = """
 """
 
 
+# Templates are served from memory; Jinja compiles each once and caches it
+app.jinja_loader = DictLoader({
+    'login.html': LOGIN_TEMPLATE,
+    'main.html': MAIN_TEMPLATE,
+})
+app.jinja_env.globals.update(
+    FIELD_TYPE_HIDDEN=FIELD_TYPE_HIDDEN,
+    FIELD_TYPE_BOOLEAN=FIELD_TYPE_BOOLEAN,
+    FIELD_TYPE_LINKED=FIELD_TYPE_LINKED,
+)
+
+STARTUP = {
+    'import_ms': round(IMPORT_SECONDS * 1000, 1),
+    'warm_up_ms': None,
+    'first_response_ms': None,
+}
+
+
+def warm_up():
+    """Compile templates and pull the vault file into the page cache"""
+    start = time.perf_counter()
+    for name in app.jinja_loader.list_templates():
+        app.jinja_env.get_template(name)
+    for path in VAULTS.available().values():
+        try:
+            with open(path, 'rb') as f:
+                while f.read(1024 * 1024):
+                    pass
+        except OSError:
+            pass
+    STARTUP['warm_up_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+
+@app.before_request
+def start_profile():
+    if PROFILER.always or (request.headers.get('X-Profile') == '1' and SESSIONS.get(session.get('sid'))):
+        g.profile = PROFILER.start()
+
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile:
+        path = PROFILER.stop(profile, request.url_rule.rule if request.url_rule else 'unmatched')
+        response.headers['X-Profile-Path'] = path
+    return response
+
+
+@app.teardown_request
+def abandon_profile(exc):
+    # after_request is skipped when a view raises; still write the profile and free the profiler
+    profile = g.pop('profile', None)
+    if profile:
+        PROFILER.stop(profile, request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.teardown_request
+def close_connections(exc):
+    # A view that raised never reached its conn.close(); closing twice is harmless
+    for conn in g.pop('connections', []):
+        conn.close()
+
+
+@app.after_request
+def record_first_response(response):
+    if STARTUP['first_response_ms'] is None:
+        STARTUP['first_response_ms'] = round((time.perf_counter() - LAUNCH_TIME) * 1000, 1)
+        print(f"First response {STARTUP['first_response_ms']:.0f} ms after launch "
+              f"(imports {STARTUP['import_ms']:.0f} ms)")
+    return response
+
+
 @app.route('/')
 def index():
-    if 'authenticated' not in session:
+    if SESSIONS.get(session.get('sid')) is None:
         return redirect(url_for('login'))
     return redirect(url_for('dashboard'))
 
 
+def render_login(error=None, status=200):
+    vaults = list(VAULTS.available())
+    return make_response(render_template('login.html', error=error, vaults=vaults,
+                                         selected=request.form.get('vault') or VAULTS.default()), status)
+
+
+def too_many_attempts(retry_after):
+    """429 response for throttled unlock attempts"""
+    retry_after = max(1, math.ceil(retry_after))
+    response = render_login(f'Too many login attempts. Try again in {retry_after} seconds', 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def unlock_busy():
+    """503 response when the unlock pool couldn't take or finish an attempt"""
+    response = render_login('The server is busy unlocking. Try again in a moment', 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         password = request.form.get('password')
-
-        # Try to connect to database
-        conn = get_db_connection(password)
-        if conn:
-            session['authenticated'] = True
-            session['db_password'] = password
+        client = request.remote_addr or 'unknown'
+        name = request.form.get('vault') or VAULTS.default()
+        if name not in VAULTS.available():
+            return render_login('Unknown vault', 400)
+
+        # Throttle before paying for a key derivation
+        allowed, retry_after = LOGIN_LIMITER.acquire(client)
+        if not allowed:
+            return too_many_attempts(retry_after)
+
+        # Derive the key and open the vault with it (the KDF runs once, on the unlock pool);
+        # the vault is only loaded, schedules and all, once the password is right
+        unlocked = verdict = None
+        try:
+            unlocked = UNLOCK_POOL.run(VAULTS.unlock, name, password)
+            verdict = unlocked is not None
+        except (UnlockPoolFull, UnlockTimeout):
+            # No verdict on the password, so no failure backoff either
+            return unlock_busy()
+        finally:
+            LOGIN_LIMITER.release(client, success=verdict)
+        if unlocked:
+            vault, key = unlocked
+            session.clear()
+            session['sid'] = SESSIONS.create(vault.name, key)
             session.permanent = True
-            conn.close()
+            vault.arm(key)
             return redirect(url_for('dashboard'))
         else:
-            return render_template_string(LOGIN_TEMPLATE, error='Invalid master password')
+            return render_login('Invalid master password')
 
-    return render_template_string(LOGIN_TEMPLATE)
+    return render_login()
 
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    try:
+        sort, descending, filters = parse_listing(request.args)
+        order = request.args.get('order', '')
+    except ValueError:
+        # A hand-edited URL shouldn't break the page: show the default listing
+        sort, descending, filters = parse_listing({})
+        order = ''
+
+    # One connection serves the whole page. Items stream straight from its cursor, so
+    # memory stays flat however large the vault is and the browser starts painting at
+    # once. It outlives the view (teardown runs before the page is sent), so it is
+    # opened directly and closed by the generator
+    key = g.db_key
+    try:
+        conn = g.vault.read_connection(key)
+    except sqlcipher.OperationalError:
+        # Locked by another device for longer than busy_timeout: the session is fine
+        return Response('The vault is busy, please reload in a moment', 503, {'Retry-After': '1'},
+                        mimetype='text/plain')
 
     if not conn:
         session.clear()
         return redirect(url_for('login'))
 
-    cursor = conn.cursor()
-
-    # Get folders with item counts
-    cursor.execute("""
-        SELECT f.id, f.name, COUNT(i.id) as count
-        FROM folders f
-        LEFT JOIN items i ON f.id = i.folder_id
-        GROUP BY f.id, f.name
-        ORDER BY f.name
-    """)
-    folders = cursor.fetchall()
-
-    # Get all items with their first URI and calculate age
-    cursor.execute("""
-        SELECT i.*, u.uri
-        FROM items i
-        LEFT JOIN uris u ON i.id = u.item_id
-        GROUP BY i.id
-        ORDER BY i.favorite DESC, i.name
-    """)
-    items_raw = cursor.fetchall()
-
-    # Add age calculation to items
-    items = []
-    for item in items_raw:
-        item_dict = dict(item)
-        age_days = calculate_password_age(item['revision_date'])
-        item_dict['age_days'] = age_days
-        item_dict['age_warning'] = get_age_warning(age_days)
-        items.append(item_dict)
-
-    cursor.execute("SELECT COUNT(*) FROM items")
-    total_items = cursor.fetchone()[0]
-
-    conn.close()
+    try:
+        cursor = conn.cursor()
+
+        # Every folder for the move/edit pickers; the tree only shows the top level,
+        # deeper levels load from /api/folders when expanded
+        cursor.execute("SELECT id, name FROM folders ORDER BY name")
+        folders = cursor.fetchall()
+        folder_tree = child_folders(conn)
+
+        cursor.execute("SELECT COUNT(*) FROM items")
+        total_items = cursor.fetchone()[0]
+    except Exception:
+        conn.close()
+        raise
+
+    def generate():
+        try:
+            yield from stream_template('main.html', folders=folders, folder_tree=folder_tree, total_items=total_items,
+                                       items=iter_dashboard_items(conn, item_rows(conn, sort, descending, filters)),
+                                       sort=sort, order=order, filters=filters)
+        finally:
+            conn.close()
 
-    return render_template_string(MAIN_TEMPLATE,
-                                 folders=folders,
-                                 items=items,
-                                 total_items=total_items)
+    return Response(stream_with_context(generate()), mimetype='text/html')
 
 
 @app.route('/add_item', methods=['POST'])
 @login_required
+@busy_on_locked
 def add_item():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    key = g.db_key
+    conn = get_db_connection(key)
 
     if not conn:
         session.clear()
         return redirect(url_for('login'))
 
-    cursor = conn.cursor()
+    writes = []
 
     # Generate new UUID for item
     item_id = str(uuid.uuid4())
@@ -1100,20 +1492,24 @@ def add_item():
     notes = request.form.get('notes')
 
     # Insert item
-    cursor.execute("""
+    hmac_key = get_hmac_key(conn)
+    digest = password_hash(hmac_key, password_value)
+    writes.append(("""
         INSERT INTO items
-        (id, folder_id, name, username, password, notes, favorite, reprompt, type, created_date, revision_date)
-        VALUES (?, ?, ?, ?, ?, ?, 0, 0, 1, ?, ?)
-    """, (item_id, folder_id, name, username, password_value, notes, now, now))
+        (id, folder_id, name, username, password, notes, favorite, reprompt, type, created_date, revision_date,
+         password_hash, fingerprint)
+        VALUES (?, ?, ?, ?, ?, ?, 0, 0, 1, ?, ?, ?, ?)
+    """, (item_id, folder_id, name, username, password_value, notes, now, now,
+          digest, item_fingerprint(hmac_key, name, username, [url], digest))))
 
     # Insert URI if provided
     if url:
-        cursor.execute("""
-            INSERT INTO uris (item_id, uri)
-            VALUES (?, ?)
-        """, (item_id, url))
+        writes.append(("""
+            INSERT INTO uris (item_id, uri, host, domain)
+            VALUES (?, ?, ?, ?)
+        """, (item_id, url) + uri_parts(url)))
 
-    conn.commit()
+    run_write(conn, writes)
     conn.close()
 
     return redirect(url_for('dashboard'))
@@ -1121,15 +1517,16 @@ def add_item():
 
 @app.route('/edit_item', methods=['POST'])
 @login_required
+@busy_on_locked
 def edit_item():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    key = g.db_key
+    conn = get_db_connection(key)
 
     if not conn:
         session.clear()
         return redirect(url_for('login'))
 
-    cursor = conn.cursor()
+    writes = []
 
     item_id = request.form.get('item_id')
     name = request.form.get('name')
@@ -1141,18 +1538,23 @@ def edit_item():
     now = datetime.utcnow().isoformat() + 'Z'
 
     # Update item
-    cursor.execute("""
+    hmac_key = get_hmac_key(conn)
+    digest = password_hash(hmac_key, password_value)
+    writes.append(("""
         UPDATE items
-        SET name = ?, folder_id = ?, username = ?, password = ?, notes = ?, revision_date = ?
+        SET name = ?, folder_id = ?, username = ?, password = ?, notes = ?, revision_date = ?, password_hash = ?,
+            fingerprint = ?
         WHERE id = ?
-    """, (name, folder_id, username, password_value, notes, now, item_id))
+    """, (name, folder_id, username, password_value, notes, now,
+          digest, item_fingerprint(hmac_key, name, username, [url], digest), item_id)))
 
     # Update or insert URI
-    cursor.execute("DELETE FROM uris WHERE item_id = ?", (item_id,))
+    writes.append(("DELETE FROM uris WHERE item_id = ?", (item_id,)))
     if url:
-        cursor.execute("INSERT INTO uris (item_id, uri) VALUES (?, ?)", (item_id, url))
+        writes.append(("INSERT INTO uris (item_id, uri, host, domain) VALUES (?, ?, ?, ?)",
+                       (item_id, url) + uri_parts(url)))
 
-    conn.commit()
+    run_write(conn, writes)
     conn.close()
 
     return redirect(url_for('dashboard'))
@@ -1160,28 +1562,29 @@ def edit_item():
 
 @app.route('/move_item', methods=['POST'])
 @login_required
+@busy_on_locked
 def move_item():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    key = g.db_key
+    conn = get_db_connection(key)
 
     if not conn:
         session.clear()
         return redirect(url_for('login'))
 
-    cursor = conn.cursor()
+    writes = []
 
     item_id = request.form.get('item_id')
     folder_id = request.form.get('folder_id') or None
     now = datetime.utcnow().isoformat() + 'Z'
 
     # Update item folder
-    cursor.execute("""
+    writes.append(("""
         UPDATE items
         SET folder_id = ?, revision_date = ?
         WHERE id = ?
-    """, (folder_id, now, item_id))
+    """, (folder_id, now, item_id)))
 
-    conn.commit()
+    run_write(conn, writes)
     conn.close()
 
     return redirect(url_for('dashboard'))
@@ -1189,9 +1592,10 @@ def move_item():
 
 @app.route('/toggle_favorite', methods=['POST'])
 @login_required
+@busy_on_locked
 def toggle_favorite():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    key = g.db_key
+    conn = get_db_connection(key)
 
     if not conn:
         return jsonify({'error': 'Not authenticated'}), 401
@@ -1201,14 +1605,13 @@ def toggle_favorite():
     favorite = data.get('favorite')
     now = datetime.utcnow().isoformat() + 'Z'
 
-    cursor = conn.cursor()
-    cursor.execute("""
+    writes = [("""
         UPDATE items
         SET favorite = ?, revision_date = ?
         WHERE id = ?
-    """, (favorite, now, item_id))
+    """, (favorite, now, item_id))]
 
-    conn.commit()
+    run_write(conn, writes)
     conn.close()
 
     return jsonify({'success': True})
@@ -1216,9 +1619,10 @@ def toggle_favorite():
 
 @app.route('/delete_item', methods=['POST'])
 @login_required
+@busy_on_locked
 def delete_item():
-    password = session.get('db_password')
-    conn = get_db_connection(password)
+    key = g.db_key
+    conn = get_db_connection(key)
 
     if not conn:
         return jsonify({'error': 'Not authenticated'}), 401
@@ -1226,28 +1630,304 @@ def delete_item():
     data = request.get_json()
     item_id = data.get('item_id')
 
-    cursor = conn.cursor()
+    writes = []
 
     # Delete related records first
-    cursor.execute("DELETE FROM uris WHERE item_id = ?", (item_id,))
-    cursor.execute("DELETE FROM fields WHERE item_id = ?", (item_id,))
-    cursor.execute("DELETE FROM items WHERE id = ?", (item_id,))
+    writes.append(("DELETE FROM uris WHERE item_id = ?", (item_id,)))
+    writes.append(("DELETE FROM fields WHERE item_id = ?", (item_id,)))
+    writes.append(("DELETE FROM breach_results WHERE item_id = ?", (item_id,)))
+    writes.append(("DELETE FROM items WHERE id = ?", (item_id,)))
 
-    conn.commit()
+    run_write(conn, writes)
     conn.close()
 
     return jsonify({'success': True})
 
 
+@app.route('/api/export')
+@login_required
+@busy_on_locked
+def export_vault():
+    key = g.db_key
+    # Outlives the view like the dashboard's: the generator closes it
+    conn = g.vault.connect(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    def generate():
+        try:
+            yield from iter_bitwarden_json(conn)
+        finally:
+            conn.close()
+
+    filename = f"cipher_warden_export_{datetime.utcnow():%Y%m%d%H%M%S}.json"
+    return Response(stream_with_context(generate()), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app.route('/api/reports/reused')
+@login_required
+@busy_on_locked
+def reused_passwords_report():
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    # Both the grouping and the lookups are served by idx_items_password_hash
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT i.password_hash, i.id, i.name, i.username, i.folder_id
+        FROM items i
+        WHERE i.password_hash IN (
+            SELECT password_hash FROM items
+            WHERE password_hash IS NOT NULL
+            GROUP BY password_hash
+            HAVING COUNT(*) > 1
+        )
+        ORDER BY i.password_hash, i.name
+    """)
+    groups = []
+    current_hash = None
+    for row in cursor:
+        if row['password_hash'] != current_hash:
+            current_hash = row['password_hash']
+            groups.append({'count': 0, 'items': []})
+        groups[-1]['count'] += 1
+        groups[-1]['items'].append({
+            'id': row['id'],
+            'name': row['name'],
+            'username': row['username'],
+            'folder_id': row['folder_id'],
+        })
+    conn.close()
+
+    groups.sort(key=lambda group: group['count'], reverse=True)
+    return jsonify({
+        'groups': groups,
+        'reused_items': sum(group['count'] for group in groups),
+    })
+
+
+@app.route('/api/match')
+@login_required
+@busy_on_locked
+def match_credentials():
+    host, domain = uri_parts(request.args.get('url', ''))
+    if not host:
+        return jsonify({'error': 'url parameter with a host is required'}), 400
+
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    # Everything that can match shares the registrable domain: one idx_uris_domain lookup
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT u.item_id, u.uri, u.host, i.name, i.username, i.folder_id
+        FROM uris u
+        JOIN items i ON i.id = u.item_id
+        WHERE u.domain = ?
+    """, (domain,))
+    best = {}
+    for row in cursor:
+        rank = match_rank(row['host'], host)
+        if row['item_id'] not in best or rank < best[row['item_id']]['rank']:
+            best[row['item_id']] = {
+                'id': row['item_id'],
+                'name': row['name'],
+                'username': row['username'],
+                'folder_id': row['folder_id'],
+                'uri': row['uri'],
+                'rank': rank,
+            }
+    conn.close()
+
+    matches = sorted(best.values(), key=lambda match: (match['rank'], match['name'].lower()))
+    return jsonify({'host': host, 'domain': domain, 'matches': matches})
+
+
+@app.route('/api/items/<item_id>/fields')
+@login_required
+@busy_on_locked
+def item_fields(item_id):
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    fields = fetch_fields(conn, [item_id]).get(item_id, [])
+    conn.close()
+
+    # Hidden fields are masked unless explicitly asked for
+    if request.args.get('reveal') != '1':
+        for field in fields:
+            if field['type'] == FIELD_TYPE_HIDDEN:
+                field['value'] = None
+                field['masked'] = True
+    return jsonify({'item_id': item_id, 'fields': fields})
+
+
+@app.route('/api/items')
+@login_required
+@busy_on_locked
+def items_api():
+    """Items (without secrets) sorted and filtered on indexed columns; see item_query.parse_listing"""
+    try:
+        sort, descending, filters = parse_listing(request.args)
+        limit = max(1, min(int(request.args.get('limit', ITEMS_PAGE_SIZE)), MAX_ITEMS_PAGE_SIZE))
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    items = []
+    for row in item_rows(conn, sort, descending, filters, limit, offset):
+        age_days = calculate_password_age(row['revision_date'])
+        items.append({
+            'id': row['id'],
+            'name': row['name'],
+            'username': row['username'],
+            'folder_id': row['folder_id'],
+            'folder_path': row['folder_path'],
+            'uri': row['uri'],
+            'favorite': row['favorite'],
+            'type': row['type'],
+            'created_date': row['created_date'],
+            'revision_date': row['revision_date'],
+            'age_days': age_days,
+            'breach_count': row['breach_count'],
+        })
+    conn.close()
+    return jsonify({'sort': sort, 'order': 'desc' if descending else 'asc', 'filters': filters,
+                    'offset': offset, 'limit': limit, 'items': items})
+
+
+@app.route('/api/folders')
+@login_required
+@busy_on_locked
+def folders_api():
+    """Folders directly under ?parent= (default: the top level) with their item counts"""
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    parent = request.args.get('parent', '').strip('/')
+    folders = child_folders(conn, parent)
+    conn.close()
+    return jsonify({'parent': parent, 'folders': folders})
+
+
+@app.route('/api/changes')
+@login_required
+@busy_on_locked
+def list_changes():
+    try:
+        since = int(request.args.get('since', 0))
+        limit = max(1, min(int(request.args.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'since and limit must be integers'}), 400
+
+    key = g.db_key
+    conn = get_read_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    # Clients keep the returned rev and pass it as `since` next time;
+    # reset means the journal no longer reaches back that far
+    feed = changes_since(conn, since, limit)
+    conn.close()
+    response = jsonify(feed)
+    # Pages of full item records compress well; peers ask for gzip
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and response.content_length > GZIP_MIN_BYTES:
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@app.route('/api/sync', methods=['POST'])
+@login_required
+@busy_on_locked
+def sync_with_peer():
+    data = request.get_json(silent=True) or {}
+    peer_url = data.get('peer', '')
+    if not peer_url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'peer must be an http(s) URL of another instance'}), 400
+    if peer_url.rstrip('/') not in SYNC_PEERS:
+        return jsonify({'error': 'peer is not configured (see CIPHER_WARDEN_PEERS)'}), 403
+    # The session only has our vault's key, so the peer's master password comes with the request
+    if not data.get('password'):
+        return jsonify({'error': "the peer's master password is required"}), 400
+
+    key = g.db_key
+    conn = get_db_connection(key)
+
+    if not conn:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    peer = PeerClient(peer_url, data['password'], data.get('vault'))
+    try:
+        peer.login()
+        stats = pull(conn, peer, lambda writes: run_write(conn, writes))
+    except SyncError as e:
+        return jsonify({'error': str(e)}), 502
+    finally:
+        conn.close()
+    return jsonify(stats)
+
+
+@app.route('/api/status')
+@login_required
+def status():
+    return jsonify({
+        'unlock_pool': UNLOCK_POOL.stats(),
+        'sessions': SESSIONS.stats(),
+        'profiler': PROFILER.status(),
+        'startup': STARTUP,
+        'vault': g.vault.name,
+        'vaults': VAULTS.status(),
+        'backups': g.vault.backups.status(),
+        'memory_replica': g.vault.replica.status(),
+        'maintenance': g.vault.maintenance.status(),
+    })
+
+
+@app.route('/api/backups', methods=['POST'])
+@login_required
+def backup_now():
+    g.vault.backups.arm(g.db_key)
+    g.vault.backups.run_now()
+    return jsonify({'success': True}), 202
+
+
 @app.route('/logout')
 def logout():
+    unlocked = SESSIONS.get(session.get('sid'))
+    SESSIONS.drop(session.get('sid'))
     session.clear()
+    vault = VAULTS.peek(unlocked[0]) if unlocked else None
+    if vault:
+        vault.replica.drop()
     return redirect(url_for('login'))
 
 
 if __name__ == '__main__':
-    if not os.path.exists(DB_PATH):
-        print(f"Error: Database file '{DB_PATH}' not found!")
+    if not VAULTS.available():
+        print(f"Error: No vault (*.db) found in '{VAULTS.vault_dir}'!")
         print("Run import_bitwarden.py first to create the database.")
         exit(1)
 
@@ -1255,11 +1935,15 @@ if __name__ == '__main__':
     print("🔐 Password Manager Starting...")
     print("="*60)
     print("\nAccess the password manager at:")
-    print("  • From this device: http://127.0.0.1:5000")
-    print("  • From local network: http://<phone-ip>:5000")
+    print(f"  • From this device: http://127.0.0.1:{PORT}")
+    print(f"  • From local network: http://<phone-ip>:{PORT}")
     print("\nTo find your phone's IP address:")
     print("  ifconfig wlan0 | grep inet")
+    print(f"\nStarted in {(time.perf_counter() - LAUNCH_TIME) * 1000:.0f} ms "
+          f"(imports {STARTUP['import_ms']:.0f} ms)")
     print("\n" + "="*60 + "\n")
 
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
     # Bind to 0.0.0.0 to allow network access
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Per-request profiling
+Opt-in cProfile wrapper for Flask requests. Each profiled request leaves a
+pstats file (open with `python -m pstats`) and a collapsed-stack file that
+flamegraph.pl or speedscope can draw, under profiles/<route>/, keeping the
+newest few per route.
+"""
+
+import cProfile
+import os
+import pstats
+import re
+import threading
+import time
+from datetime import datetime
+
+PROFILE_DIR = 'profiles'
+PROFILE_KEEP = 20  # profiles kept per route
+MIN_PATH_SECONDS = 1e-5  # call paths carrying less time than this are left out of the flame graph
+
+
+def route_slug(rule):
+    return re.sub(r'[^A-Za-z0-9]+', '_', rule).strip('_') or 'root'
+
+
+def func_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # built-in, e.g. <method 'execute' of 'sqlite3.Connection' objects>
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats):
+    """Lines of 'outer;inner;leaf microseconds' rebuilt from cProfile's caller
+    graph. cProfile only records caller->callee totals, so time is split
+    between call paths in proportion to each edge: a close approximation of
+    a real sampled flame graph, exact when every function has one caller."""
+    children = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            # edge = (primitive calls, calls, self time, cumulative time) via this caller
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    totals = {}
+
+    def walk(func, stack, share):
+        # share: the fraction of func's total time spent on this call path
+        tt = stats.stats[func][2]
+        stack.append(func_label(func))
+        line = ';'.join(stack)
+        totals[line] = totals.get(line, 0) + tt * share
+        for child, edge_cum in children.get(func, ()):
+            child_ct = stats.stats[child][3]
+            # Skip paths too thin to see (shared helpers would otherwise multiply
+            # into millions of paths) and recursion already counted further up
+            if share * edge_cum < MIN_PATH_SECONDS or func_label(child) in stack:
+                continue
+            walk(child, stack, share * edge_cum / child_ct)
+        stack.pop()
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return [f"{line} {round(seconds * 1e6)}" for line, seconds in totals.items() if seconds > 0]
+
+
+class RequestProfiler:
+    """Profiles one request at a time; others run unprofiled meanwhile"""
+
+    def __init__(self, profile_dir=PROFILE_DIR, keep=PROFILE_KEEP, always=False):
+        self.profile_dir = profile_dir
+        self.keep = keep
+        # Profile every request, not just those that ask for it
+        self.always = always
+        self.lock = threading.Lock()
+        self.written = 0
+
+    def start(self):
+        """A running profile, or None if another request is being profiled"""
+        if not self.lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.started = time.perf_counter()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, rule):
+        """Finish a profile and write it under the route's directory; returns the pstats path"""
+        profile.disable()
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        self.lock.release()
+
+        route_dir = os.path.join(self.profile_dir, route_slug(rule))
+        os.makedirs(route_dir, exist_ok=True)
+        base = os.path.join(route_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{elapsed_ms:.0f}ms")
+        stats = pstats.Stats(profile)
+        stats.dump_stats(base + '.prof')
+        with open(base + '.collapsed', 'w') as f:
+            f.write('\n'.join(collapsed_stacks(stats)) + '\n')
+        self.written += 1
+        self.rotate(route_dir)
+        return base + '.prof'
+
+    def rotate(self, route_dir):
+        profiles = sorted(name[:-5] for name in os.listdir(route_dir) if name.endswith('.prof'))
+        for base in profiles[:-self.keep]:
+            for suffix in ('.prof', '.collapsed'):
+                try:
+                    os.remove(os.path.join(route_dir, base + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def status(self):
+        return {'always': self.always, 'dir': self.profile_dir, 'written': self.written}
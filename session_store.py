@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Server-side login sessions
+The cookie only carries an opaque session ID; which vault is unlocked and
+the raw key that opens it (see vault.derive_key) stay in this process. The store is
+capped (least recently used sessions are evicted first) and sessions expire
+after an idle period and after an absolute lifetime, whichever comes first.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+MAX_SESSIONS = 32
+SESSION_IDLE_TIMEOUT = 30 * 60        # seconds without a request
+SESSION_MAX_AGE = 5 * 60 * 60         # seconds since login, however active
+SESSION_SWEEP_INTERVAL = 60
+
+
+class SessionStore:
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT, max_age=SESSION_MAX_AGE):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # session id -> [(vault, key), created, last_seen], least recently used first
+        self.sessions = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+        self.sweeper = None
+
+    def create(self, vault, key):
+        """Start a session for an unlocked vault; returns its ID for the cookie"""
+        session_id = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self.lock:
+            self.sessions[session_id] = [(vault, key), now, now]
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep, name='session-sweeper', daemon=True)
+                self.sweeper.start()
+        return session_id
+
+    def get(self, session_id):
+        """The session's (vault, key), or None if it is unknown or has expired"""
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                del self.sessions[session_id]
+                self.expired += 1
+                return None
+            entry[2] = now
+            self.sessions.move_to_end(session_id)
+            return entry[0]
+
+    def drop(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def _expired(self, entry, now):
+        return now - entry[2] > self.idle_timeout or now - entry[1] > self.max_age
+
+    def _sweep(self):
+        while True:
+            time.sleep(SESSION_SWEEP_INTERVAL)
+            now = time.monotonic()
+            with self.lock:
+                for session_id in [sid for sid, entry in self.sessions.items() if self._expired(entry, now)]:
+                    del self.sessions[session_id]
+                    self.expired += 1
+
+    def stats(self):
+        return {
+            'active': len(self.sessions),
+            'max': self.max_sessions,
+            'evicted': self.evicted,
+            'expired': self.expired,
+        }
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Peer-to-peer sync between two cipher-warden instances
+Each side pulls the other's /api/changes feed since the last revision it
+saw, page by page (gzip over HTTP), and applies it locally. Conflicts are
+settled per item and per folder by revision_date: the newer edit wins, ties
+are skipped, so changes echoed back from the peer are never applied twice.
+Deletes are dated by the journal: a delete beats edits made before it, on
+either side.
+"""
+
+import gzip
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from changes import CHANGES_PAGE_SIZE
+from uri_match import uri_parts
+from vault import get_hmac_key, item_fingerprint, password_hash
+
+SYNC_TIMEOUT = 30  # seconds per HTTP request
+
+
+class SyncError(Exception):
+    pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Logging in redirects to the dashboard; don't render it just to throw it away
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class PeerClient:
+    """Logged-in HTTP session with another instance"""
+
+    def __init__(self, url, password, vault=None):
+        self.url = url.rstrip('/')
+        self.password = password
+        # Which of the peer's vaults to pull from (None: its default one)
+        self.vault = vault
+        self.name = self.url + ('#' + vault if vault else '')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def login(self):
+        form = {'password': self.password}
+        if self.vault:
+            form['vault'] = self.vault
+        data = urllib.parse.urlencode(form).encode()
+        try:
+            response = self.opener.open(self.url + '/login', data, timeout=SYNC_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code == 302 and e.headers.get('Location', '').endswith('/dashboard'):
+                return
+            if e.code == 429:
+                raise SyncError(f"peer is throttling logins, retry in {e.headers.get('Retry-After')}s")
+            raise SyncError(f"peer login failed: HTTP {e.code}")
+        except urllib.error.URLError as e:
+            raise SyncError(f"can't reach {self.url}: {e.reason}")
+        response.close()
+        raise SyncError("peer rejected the master password")
+
+    def changes(self, since, limit=CHANGES_PAGE_SIZE):
+        query = urllib.parse.urlencode({'since': since, 'limit': limit})
+        request = urllib.request.Request(f'{self.url}/api/changes?{query}',
+                                         headers={'Accept-Encoding': 'gzip'})
+        try:
+            with self.opener.open(request, timeout=SYNC_TIMEOUT) as response:
+                body = response.read()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+        except urllib.error.HTTPError as e:
+            raise SyncError(f"peer refused /api/changes: HTTP {e.code}")
+        except urllib.error.URLError as e:
+            raise SyncError(f"can't reach {self.url}: {e.reason}")
+        return json.loads(body)
+
+
+def peer_key(name):
+    return 'sync_rev:' + name
+
+
+def last_revision(conn, name):
+    row = conn.execute("SELECT value FROM vault_meta WHERE key = ?", (peer_key(name),)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def item_writes(item, hmac_key, exists):
+    writes = []
+    digest = password_hash(hmac_key, item['password'])
+    values = (item['folder_id'], item['name'], item['username'], item['password'], item['notes'],
+              item['favorite'], item['reprompt'], item['type'], item['created_date'], item['revision_date'],
+              digest, item_fingerprint(hmac_key, item['name'], item['username'], item['uris'], digest), item['id'])
+    if exists:
+        writes.append(("""
+            UPDATE items
+            SET folder_id = ?, name = ?, username = ?, password = ?, notes = ?, favorite = ?, reprompt = ?,
+                type = ?, created_date = ?, revision_date = ?, password_hash = ?, fingerprint = ?
+            WHERE id = ?
+        """, values))
+        writes.append(("DELETE FROM uris WHERE item_id = ?", (item['id'],)))
+        writes.append(("DELETE FROM fields WHERE item_id = ?", (item['id'],)))
+    else:
+        writes.append(("""
+            INSERT INTO items
+            (folder_id, name, username, password, notes, favorite, reprompt, type, created_date, revision_date,
+             password_hash, fingerprint, id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, values))
+    for uri in item['uris']:
+        writes.append(("INSERT INTO uris (item_id, uri, host, domain) VALUES (?, ?, ?, ?)",
+                       (item['id'], uri) + uri_parts(uri)))
+    for field in item['fields']:
+        writes.append(("INSERT INTO fields (item_id, name, value, type) VALUES (?, ?, ?, ?)",
+                       (item['id'], field['name'], field['value'], field['type'])))
+    return writes
+
+
+def sync_writes(conn, changes):
+    """(writes, applied, skipped) bringing the local vault up to a page of peer changes"""
+    item_ids = [c['id'] for c in changes if c['entity'] == 'item']
+    folder_ids = [c['id'] for c in changes if c['entity'] == 'folder']
+    local_items = {}
+    if item_ids:
+        placeholders = ','.join('?' * len(item_ids))
+        local_items = dict(conn.execute(
+            f"SELECT id, revision_date FROM items WHERE id IN ({placeholders})", item_ids).fetchall())
+    local_folders = {}
+    if folder_ids:
+        placeholders = ','.join('?' * len(folder_ids))
+        local_folders = dict(conn.execute(
+            f"SELECT id, revision_date FROM folders WHERE id IN ({placeholders})", folder_ids).fetchall())
+    # When we deleted something the peer still has, our journal's tombstone dates the delete
+    deleted = {}
+    missing = [(c['entity'], c['id']) for c in changes if c['op'] == 'upsert'
+               and c['id'] not in (local_items if c['entity'] == 'item' else local_folders)]
+    for entity in ('item', 'folder'):
+        ids = [entity_id for kind, entity_id in missing if kind == entity]
+        if ids:
+            placeholders = ','.join('?' * len(ids))
+            deleted.update(((entity, row[0]), row[1]) for row in conn.execute(f"""
+                SELECT entity_id, MAX(changed_at) FROM changes
+                WHERE entity = ? AND op = 'delete' AND entity_id IN ({placeholders})
+                GROUP BY entity_id
+            """, [entity] + ids))
+    hmac_key = get_hmac_key(conn)
+
+    writes = []
+    applied = skipped = 0
+    for change in changes:
+        entity_id = change['id']
+        if change['entity'] == 'folder':
+            local_revision = local_folders.get(entity_id)
+            if change['op'] == 'delete':
+                # Same rule as items: a delete doesn't undo a newer local rename
+                if entity_id not in local_folders or (local_revision or '') > change['changed_at']:
+                    skipped += 1
+                    continue
+                writes.append(("UPDATE items SET folder_id = NULL WHERE folder_id = ?", (entity_id,)))
+                writes.append(("DELETE FROM folders WHERE id = ?", (entity_id,)))
+            else:
+                folder = change['folder']
+                if entity_id in local_folders:
+                    local_revision = local_revision or ''
+                else:
+                    local_revision = deleted.get(('folder', entity_id))
+                if local_revision is not None and local_revision >= (folder['revision_date'] or ''):
+                    skipped += 1
+                    continue
+                if entity_id in local_folders:
+                    writes.append(("UPDATE folders SET name = ?, revision_date = ? WHERE id = ?",
+                                   (folder['name'], folder['revision_date'], entity_id)))
+                else:
+                    writes.append(("INSERT INTO folders (id, name, revision_date) VALUES (?, ?, ?)",
+                                   (entity_id, folder['name'], folder['revision_date'])))
+            applied += 1
+            continue
+
+        local_revision = local_items.get(entity_id)
+        if change['op'] == 'delete':
+            # A delete only wins over a local edit made before it
+            if entity_id not in local_items or (local_revision or '') > change['changed_at']:
+                skipped += 1
+                continue
+            writes.append(("DELETE FROM uris WHERE item_id = ?", (entity_id,)))
+            writes.append(("DELETE FROM fields WHERE item_id = ?", (entity_id,)))
+            writes.append(("DELETE FROM breach_results WHERE item_id = ?", (entity_id,)))
+            writes.append(("DELETE FROM items WHERE id = ?", (entity_id,)))
+        else:
+            item = change['item']
+            if entity_id in local_items:
+                local_revision = local_revision or ''
+            else:
+                # An edit made before our delete doesn't bring the item back
+                local_revision = deleted.get(('item', entity_id))
+            if local_revision is not None and local_revision >= (item['revision_date'] or ''):
+                skipped += 1
+                continue
+            writes.extend(item_writes(item, hmac_key, entity_id in local_items))
+        applied += 1
+    return writes, applied, skipped
+
+
+def pull(conn, peer, run_writes):
+    """Pull everything `peer` (a logged-in PeerClient) changed since the last sync.
+    run_writes(writes) commits one page of (sql, params) writes; returns stats."""
+    since = last_revision(conn, peer.name)
+    stats = {'peer': peer.name, 'since': since, 'pages': 0, 'applied': 0, 'skipped': 0, 'reset': False}
+    while True:
+        feed = peer.changes(since)
+        if feed['reset']:
+            # We were away longer than the peer keeps deletes: take its full state
+            stats['reset'] = True
+            since = 0
+            continue
+        writes, applied, skipped = sync_writes(conn, feed['changes'])
+        # The revision is recorded in the same transaction as the page it covers
+        writes.append(("INSERT OR REPLACE INTO vault_meta (key, value) VALUES (?, ?)",
+                       (peer_key(peer.name), str(feed['rev']))))
+        run_writes(writes)
+        stats['pages'] += 1
+        stats['applied'] += applied
+        stats['skipped'] += skipped
+        since = feed['rev']
+        if not feed['more']:
+            break
+    stats['rev'] = since
+    return stats
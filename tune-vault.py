@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Vault tuning and re-keying
+Benchmarks SQLCipher KDF iterations / page sizes on this device and
+migrates passwords.db to the chosen settings with sqlcipher_export
+"""
+
+import argparse
+import getpass
+import os
+import statistics
+import sys
+import time
+
+from vault import (DB_PATH, USE_SQLCIPHER, export_vault, load_cipher_settings,
+                   open_vault, save_cipher_settings)
+
+# The queries the dashboard runs on every page load
+DASHBOARD_QUERIES = [
+    """
+        SELECT f.id, f.name, COUNT(i.id) as count
+        FROM folders f
+        LEFT JOIN items i ON f.id = i.folder_id
+        GROUP BY f.id, f.name
+        ORDER BY f.name
+    """,
+    """
+        SELECT i.*, u.uri
+        FROM items i
+        LEFT JOIN uris u ON i.id = u.item_id
+        GROUP BY i.id
+        ORDER BY i.favorite DESC, i.name
+    """,
+    "SELECT COUNT(*) FROM items",
+]
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def in_use(db_path):
+    """A -wal file means some process (the server, the agent) still has the vault open"""
+    return os.path.exists(db_path + '-wal')
+
+
+def measure(db_path, password, settings, rounds):
+    """Return median (unlock_ms, dashboard_ms) for a vault file"""
+    unlock_times = []
+    query_times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        conn = open_vault(password, db_path, settings)
+        conn.execute("SELECT COUNT(*) FROM folders").fetchone()
+        unlocked = time.perf_counter()
+        for query in DASHBOARD_QUERIES:
+            conn.execute(query).fetchall()
+        done = time.perf_counter()
+        conn.close()
+        unlock_times.append((unlocked - start) * 1000)
+        query_times.append((done - unlocked) * 1000)
+    return statistics.median(unlock_times), statistics.median(query_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark and change the vault's SQLCipher settings")
+    parser.add_argument('--db', default=DB_PATH, help="vault file (default: passwords.db)")
+    parser.add_argument('--kdf-iter', type=parse_int_list, default=[64000, 128000, 256000],
+                        help="comma separated KDF iteration counts to try")
+    parser.add_argument('--page-size', type=parse_int_list, default=[4096, 8192],
+                        help="comma separated cipher page sizes to try")
+    parser.add_argument('--rounds', type=int, default=3, help="measurements per candidate")
+    parser.add_argument('--rekey', action='store_true', help="also change the master password")
+    parser.add_argument('--choose', type=int, help="apply this candidate number without asking")
+    args = parser.parse_args()
+
+    if not USE_SQLCIPHER:
+        print("Error: pysqlcipher3 is required to tune an encrypted vault")
+        sys.exit(1)
+
+    if not os.path.exists(args.db):
+        print(f"Error: Database file '{args.db}' not found!")
+        sys.exit(1)
+
+    if in_use(args.db):
+        print(f"Error: '{args.db}' is open elsewhere (stop the server and the agent first)")
+        sys.exit(1)
+
+    password = getpass.getpass("Master password: ")
+    current = load_cipher_settings(args.db)
+    try:
+        source = open_vault(password, args.db, current)
+        source.execute("SELECT COUNT(*) FROM folders").fetchone()
+    except Exception:
+        print("Error: Invalid master password")
+        sys.exit(1)
+
+    new_password = password
+    if args.rekey:
+        new_password = getpass.getpass("New master password: ")
+        if new_password != getpass.getpass("Confirm new password: "):
+            print("Error: Passwords don't match")
+            sys.exit(1)
+        if len(new_password) < 8:
+            print("Warning: Password is short. Consider using 12+ characters")
+
+    print(f"\nCurrent settings: kdf_iter={current['kdf_iter']}, cipher_page_size={current['cipher_page_size']}")
+    base_unlock, base_query = measure(args.db, password, current, args.rounds)
+    print(f"Current: unlock {base_unlock:.0f} ms, dashboard queries {base_query:.1f} ms\n")
+
+    candidates = []
+    for kdf_iter in args.kdf_iter:
+        for page_size in args.page_size:
+            settings = {'kdf_iter': kdf_iter, 'cipher_page_size': page_size}
+            path = f"{args.db}.tune-{kdf_iter}-{page_size}"
+            if os.path.exists(path):
+                os.remove(path)
+            export_vault(source, path, new_password, settings)
+            unlock_ms, query_ms = measure(path, new_password, settings, args.rounds)
+            candidates.append((settings, path, unlock_ms, query_ms))
+    source.close()
+
+    print(f"{'#':>3}  {'kdf_iter':>9}  {'page':>6}  {'unlock ms':>10}  {'dashboard ms':>13}")
+    for number, (settings, _, unlock_ms, query_ms) in enumerate(candidates, 1):
+        print(f"{number:>3}  {settings['kdf_iter']:>9}  {settings['cipher_page_size']:>6}  "
+              f"{unlock_ms:>10.0f}  {query_ms:>13.1f}")
+    print("\nLower kdf_iter unlocks faster but makes brute-forcing a stolen vault cheaper.")
+
+    choice = args.choose
+    if choice is None:
+        answer = input("Apply which candidate? (number, Enter to cancel): ").strip()
+        choice = int(answer) if answer.isdigit() else None
+
+    chosen = None
+    if choice is not None and 1 <= choice <= len(candidates):
+        chosen = candidates[choice - 1]
+
+    for settings, path, _, _ in candidates:
+        if chosen is None or path != chosen[1]:
+            os.remove(path)
+
+    if chosen is None:
+        print("No changes made.")
+        return
+
+    settings, path = chosen[0], chosen[1]
+    if in_use(args.db):
+        os.remove(path)
+        print(f"Error: '{args.db}' was opened elsewhere while tuning; no changes made")
+        sys.exit(1)
+    backup_path = args.db + '.pre-tune'
+    os.replace(args.db, backup_path)
+    # The old vault keeps its own settings, so it still opens if the tuning is undone
+    save_cipher_settings(backup_path, current)
+    os.replace(path, args.db)
+    save_cipher_settings(args.db, settings)
+
+    print(f"\n✓ Vault migrated: kdf_iter={settings['kdf_iter']}, cipher_page_size={settings['cipher_page_size']}")
+    if args.rekey:
+        print("✓ Master password changed")
+    print(f"✓ Previous vault kept as {backup_path} (delete it once you've checked the new one)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Bounded worker pool for key derivation
+Unlocks run here instead of on the request thread, so a few simultaneous
+logins can't starve dashboard requests of CPU
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class UnlockPoolFull(Exception):
+    """Raised when too many unlocks are already waiting"""
+
+
+class UnlockTimeout(Exception):
+    """Raised when an unlock didn't finish in time"""
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class UnlockPool:
+    """A few KDF worker threads with a bounded queue in front of them"""
+
+    def __init__(self, workers=None, max_queue=8, timeout=30.0):
+        # Leave half the cores for serving ordinary requests
+        self.workers = workers or max(1, available_cores() // 2)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='unlock')
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _run(self, fn, args):
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for it (up to the timeout)"""
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise UnlockPoolFull()
+            self.queued += 1
+        future = self.executor.submit(self._run, fn, args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self.lock:
+                self.timed_out += 1
+            if future.cancel():
+                with self.lock:
+                    self.queued -= 1
+            raise UnlockTimeout()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+
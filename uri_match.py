@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+URI normalisation for credential matching
+Splits stored URIs into a host and a registrable domain so matches can be
+found with an index lookup instead of scanning every URI
+"""
+
+import ipaddress
+from urllib.parse import urlsplit
+
+# Common two-label public suffixes; without them "example.co.uk" would
+# collapse to "co.uk". Not the full Public Suffix List, just what shows up
+# in typical vaults.
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'me.uk', 'net.uk', 'ltd.uk', 'plc.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au',
+    'co.nz', 'org.nz', 'net.nz', 'govt.nz',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp',
+    'co.kr', 'or.kr', 'co.in', 'net.in', 'org.in', 'gov.in',
+    'co.za', 'org.za', 'com.br', 'net.br', 'org.br', 'gov.br',
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'com.hk', 'com.tw', 'com.sg', 'com.my',
+    'com.mx', 'com.ar', 'com.tr', 'com.ua', 'co.il', 'com.pl', 'co.id',
+    'github.io', 'gitlab.io', 'herokuapp.com', 'netlify.app', 'vercel.app',
+    'blogspot.com', 'appspot.com', 'azurewebsites.net', 'cloudfront.net',
+}
+
+
+def normalise_host(uri):
+    """Lower-cased host of a URI (scheme optional), or None"""
+    if not uri:
+        return None
+    uri = uri.strip()
+    if '://' not in uri:
+        uri = 'http://' + uri
+    try:
+        host = urlsplit(uri).hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    host = host.rstrip('.').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
+
+
+def registrable_domain(host):
+    """The part of a host a site owner registered, e.g. mail.google.co.uk -> google.co.uk"""
+    if not host:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split('.')
+    if len(labels) <= 2:
+        return host
+    if '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def uri_parts(uri):
+    """(host, registrable domain) for storing next to a URI; ('', '') when it has no usable host,
+    so those URIs aren't re-parsed by migrate on every unlock"""
+    host = normalise_host(uri)
+    return host or '', registrable_domain(host) or ''
+
+
+def match_rank(stored_host, host):
+    """0 = same host, 1 = one is a subdomain of the other, 2 = same registrable domain"""
+    if stored_host == host:
+        return 0
+    if stored_host.endswith('.' + host) or host.endswith('.' + stored_host):
+        return 1
+    return 2
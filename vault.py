@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Shared vault connection helpers
+Every script opens passwords.db through here so the cipher settings
+chosen with tune-vault.py are applied the same way everywhere
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import urllib.parse
+
+# Try to import pysqlcipher3, fallback to regular sqlite (the importer warns about this)
+try:
+    from pysqlcipher3 import dbapi2 as sqlcipher
+    USE_SQLCIPHER = True
+except ImportError:
+    USE_SQLCIPHER = False
+    sqlcipher = sqlite3
+
+DB_PATH = 'passwords.db'
+
+# How long a connection waits on another device's write lock before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# SQLCipher 4 defaults (cipher_compatibility = 4)
+DEFAULT_CIPHER_SETTINGS = {
+    'kdf_iter': 256000,
+    'cipher_page_size': 4096,
+}
+KDF_SALT_BYTES = 16  # stored in the clear at the start of the vault file
+KEY_BYTES = 32
+
+
+def quote(value):
+    """Quote a string literal for PRAGMA / ATTACH statements"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def settings_path(db_path):
+    """Sidecar file holding the (non-secret) cipher parameters of a vault"""
+    return db_path + '.cipher.json'
+
+
+def load_cipher_settings(db_path=DB_PATH):
+    """Return the cipher settings a vault was written with"""
+    settings = dict(DEFAULT_CIPHER_SETTINGS)
+    try:
+        with open(settings_path(db_path), 'r') as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return settings
+    for key in DEFAULT_CIPHER_SETTINGS:
+        if key in stored:
+            settings[key] = int(stored[key])
+    return settings
+
+
+def save_cipher_settings(db_path, settings):
+    """Record the cipher settings next to the vault (atomically)"""
+    path = settings_path(db_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({key: int(settings[key]) for key in DEFAULT_CIPHER_SETTINGS}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def derive_key(password, db_path=DB_PATH, settings=None):
+    """Run the vault's KDF once (PBKDF2-HMAC-SHA512 with the file's salt, as SQLCipher 4 does)
+    and return the raw key plus that salt. Anything taking a password also takes this key,
+    which opens the vault without deriving it again."""
+    if settings is None:
+        settings = load_cipher_settings(db_path)
+    with open(db_path, 'rb') as f:
+        salt = f.read(KDF_SALT_BYTES)
+    key = hashlib.pbkdf2_hmac('sha512', password.encode('utf-8'), salt, int(settings['kdf_iter']), KEY_BYTES)
+    return key + salt
+
+
+def key_literal(key):
+    """SQL literal keying a connection with a master password or a derive_key() key"""
+    if isinstance(key, bytes):
+        # Raw key: SQLCipher skips the KDF, and new files (exports) get the same salt
+        return '"x' + quote(key.hex()) + '"'
+    return quote(key)
+
+
+def apply_cipher_settings(conn, key, settings, schema=None):
+    """Key a connection (or attached schema) and apply its cipher settings"""
+    if not USE_SQLCIPHER:
+        return
+    prefix = f"{schema}." if schema else ""
+    conn.execute(f"PRAGMA {prefix}key = {key_literal(key)}")
+    conn.execute(f"PRAGMA {prefix}cipher_compatibility = 4")
+    conn.execute(f"PRAGMA {prefix}kdf_iter = {int(settings['kdf_iter'])}")
+    conn.execute(f"PRAGMA {prefix}cipher_page_size = {int(settings['cipher_page_size'])}")
+
+
+def open_vault(password, db_path=DB_PATH, settings=None, read_only=False, **connect_kwargs):
+    """Open the vault with its recorded cipher settings, raising on a wrong key.
+    `password` may also be a derive_key() key, which skips the KDF.
+    read_only opens a copy (a backup) without changing it, journal mode included."""
+    if settings is None:
+        settings = load_cipher_settings(db_path)
+    if read_only:
+        uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+        conn = sqlcipher.connect(uri, uri=True, **connect_kwargs)
+    else:
+        conn = sqlcipher.connect(db_path, **connect_kwargs)
+    try:
+        apply_cipher_settings(conn, password, settings)
+        # Before the first read, so even that waits out another device's lock
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        # Reading the schema forces key derivation, so a wrong key fails here
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        if not read_only:
+            # WAL lets readers on other devices carry on while one device writes
+            conn.execute("PRAGMA journal_mode = WAL")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def migrate(conn):
+    """Bring an older vault's schema up to date (safe to run on every unlock)"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fields_item ON fields(item_id)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vault_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    # Per-vault secret for keyed hashes, created once here; OR IGNORE keeps an existing one
+    conn.execute("INSERT OR IGNORE INTO vault_meta (key, value) VALUES ('hmac_key', ?)",
+                 (secrets.token_hex(32),))
+
+    # Keyed password hashes for the reuse report
+    if 'password_hash' not in table_columns(conn, 'items'):
+        conn.execute("ALTER TABLE items ADD COLUMN password_hash TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_password_hash ON items(password_hash)")
+    missing = conn.execute("""
+        SELECT id, password FROM items
+        WHERE password_hash IS NULL AND password IS NOT NULL AND password != ''
+    """).fetchall()
+    if missing:
+        key = get_hmac_key(conn)
+        conn.executemany("UPDATE items SET password_hash = ? WHERE id = ?",
+                         [(password_hash(key, row[1]), row[0]) for row in missing])
+
+    # Content fingerprints for duplicate detection (after password_hash, which they include)
+    if 'fingerprint' not in table_columns(conn, 'items'):
+        conn.execute("ALTER TABLE items ADD COLUMN fingerprint TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_fingerprint ON items(fingerprint)")
+    missing = conn.execute("""
+        SELECT i.id, i.name, i.username, i.password_hash, u.uri
+        FROM items i LEFT JOIN uris u ON u.item_id = i.id
+        WHERE i.fingerprint IS NULL
+    """).fetchall()
+    if missing:
+        key = get_hmac_key(conn)
+        uris = {}
+        for row in missing:
+            uris.setdefault(row[0], []).append(row[4])
+        conn.executemany("UPDATE items SET fingerprint = ? WHERE id = ?",
+                         [(item_fingerprint(key, row[1], row[2], uris.pop(row[0]), row[3]), row[0])
+                          for row in missing if row[0] in uris])
+
+    # Normalised host / registrable domain for credential matching
+    uri_columns = table_columns(conn, 'uris')
+    if 'host' not in uri_columns:
+        conn.execute("ALTER TABLE uris ADD COLUMN host TEXT")
+    if 'domain' not in uri_columns:
+        conn.execute("ALTER TABLE uris ADD COLUMN domain TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uris_domain ON uris(domain, host)")
+    # domain leads idx_uris_domain, so this is an index lookup rather than a scan of uris
+    missing = conn.execute("SELECT id, uri FROM uris WHERE domain IS NULL").fetchall()
+    if missing:
+        from uri_match import uri_parts
+        conn.executemany("UPDATE uris SET host = ?, domain = ? WHERE id = ?",
+                         [uri_parts(row[1]) + (row[0],) for row in missing])
+
+    # Offline breach check results, valid while the password hash still matches
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS breach_results (
+            item_id TEXT PRIMARY KEY,
+            password_hash TEXT,
+            breach_count INTEGER,
+            checked_at TEXT
+        )
+    """)
+
+    # Folders carry a revision_date like items, so sync can tell which rename is newer
+    if 'revision_date' not in table_columns(conn, 'folders'):
+        conn.execute("ALTER TABLE folders ADD COLUMN revision_date TEXT")
+
+    # Folder tree: path index (see folder_tree.py) and per-folder item counts kept by triggers
+    from folder_tree import PATH_KEY
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_folders_path ON folders({PATH_KEY})")
+    schema = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    # Older vaults uncounted items in a BEFORE INSERT trigger, which also fired for INSERT OR IGNORE
+    # and upserts that never removed anything; drop it and count again from scratch
+    stale_stats = 'folder_stats_replace' in schema
+    new_stats = 'folder_stats' not in schema or stale_stats
+    if stale_stats:
+        conn.execute("DROP TRIGGER folder_stats_replace")
+        conn.execute("DELETE FROM folder_stats")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folder_stats (
+            folder_id TEXT PRIMARY KEY,
+            items INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # No INSERT OR IGNORE here: an outer statement's conflict clause would override it.
+    # Items are never written with INSERT OR REPLACE: it removes the old row without firing
+    # the delete trigger, so the old folder would keep counting it (importers UPDATE instead)
+    count_in = """
+        INSERT INTO folder_stats (folder_id) SELECT NEW.folder_id
+        WHERE NOT EXISTS (SELECT 1 FROM folder_stats WHERE folder_id = NEW.folder_id);
+        UPDATE folder_stats SET items = items + 1 WHERE folder_id = NEW.folder_id;
+    """
+    count_out = "UPDATE folder_stats SET items = items - 1 WHERE folder_id = OLD.folder_id;"
+    for name, event, when, body in (
+            ('insert', 'INSERT', 'NEW.folder_id IS NOT NULL', count_in),
+            ('delete', 'DELETE', 'OLD.folder_id IS NOT NULL', count_out),
+            ('move_out', 'UPDATE OF folder_id', 'OLD.folder_id IS NOT NEW.folder_id AND OLD.folder_id IS NOT NULL',
+             count_out),
+            ('move_in', 'UPDATE OF folder_id', 'OLD.folder_id IS NOT NEW.folder_id AND NEW.folder_id IS NOT NULL',
+             count_in)):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS folder_stats_{name}
+            AFTER {event} ON items
+            WHEN {when}
+            BEGIN
+                {body}
+            END
+        """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS folder_stats_folder_delete
+        AFTER DELETE ON folders
+        BEGIN
+            DELETE FROM folder_stats WHERE folder_id = OLD.id;
+        END
+    """)
+    if new_stats:
+        conn.execute("""
+            INSERT INTO folder_stats (folder_id, items)
+            SELECT folder_id, COUNT(*) FROM items WHERE folder_id IS NOT NULL GROUP BY folder_id
+        """)
+
+    # Composite indexes behind every sort key of the item listings (see item_query.py)
+    from item_query import index_statements
+    for statement in index_statements():
+        conn.execute(statement)
+
+    # Change journal behind /api/changes: triggers log every write, whoever makes it
+    new_journal = 'changes' not in {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS changes (
+            rev INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_changes_entity ON changes(entity, entity_id)")
+    for table, entity, key in (('items', 'item', 'id'), ('folders', 'folder', 'id'),
+                               ('uris', 'item', 'item_id'), ('fields', 'item', 'item_id')):
+        # Changes to an item's URIs or fields count as changes to the item
+        child = table in ('uris', 'fields')
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            op = 'delete' if event == 'DELETE' and not child else 'upsert'
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS journal_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO changes (entity, entity_id, op) VALUES ('{entity}', {row}.{key}, '{op}');
+                END
+            """)
+    if new_journal:
+        # Rows written before the journal existed start out as one upsert each
+        conn.execute("INSERT INTO changes (entity, entity_id, op) SELECT 'folder', id, 'upsert' FROM folders")
+        conn.execute("INSERT INTO changes (entity, entity_id, op) SELECT 'item', id, 'upsert' FROM items")
+    conn.commit()
+
+
+def get_hmac_key(conn):
+    """Per-vault secret for keyed hashes; lives inside the encrypted vault (created by migrate)"""
+    row = conn.execute("SELECT value FROM vault_meta WHERE key = 'hmac_key'").fetchone()
+    if row is None:
+        raise RuntimeError("Vault has no HMAC key; run migrate() after unlocking")
+    return bytes.fromhex(row[0])
+
+
+def password_hash(key, password):
+    """HMAC of a password so equal passwords can be found without indexing plaintext"""
+    if not password:
+        return None
+    return hmac.new(key, password.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def item_fingerprint(key, name, username, uris, password_digest):
+    """Keyed hash of what makes two items the same login: name, username, URIs and
+    password (as its password_hash), normalised so case and trailing slashes don't matter"""
+    uris = sorted({uri.strip().lower().rstrip('/') for uri in uris if uri and uri.strip()})
+    parts = [(name or '').strip().lower(), (username or '').strip().lower(), '\n'.join(uris), password_digest or '']
+    return hmac.new(key, '\0'.join(parts).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def checkpoint(conn, mode='PASSIVE'):
+    """Copy WAL frames back into the vault; returns (busy, wal_pages, checkpointed_pages)"""
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+def is_locked_error(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED errors that are worth retrying"""
+    message = str(error).lower()
+    return isinstance(error, sqlcipher.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def export_vault(conn, dest_path, password, settings):
+    """Copy an open vault into a new file with other cipher settings (sqlcipher_export)"""
+    if not USE_SQLCIPHER:
+        # Plain SQLite has no sqlcipher_export; the copy is as unencrypted as the vault
+        conn.execute("VACUUM INTO ?", (dest_path,))
+        return
+    conn.execute(f"ATTACH DATABASE {quote(dest_path)} AS tuned KEY {key_literal(password)}")
+    try:
+        conn.execute(f"PRAGMA tuned.cipher_page_size = {int(settings['cipher_page_size'])}")
+        conn.execute(f"PRAGMA tuned.kdf_iter = {int(settings['kdf_iter'])}")
+        conn.execute("SELECT sqlcipher_export('tuned')")
+    finally:
+        conn.execute("DETACH DATABASE tuned")
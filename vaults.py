@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Vaults served by one server process
+Every *.db file in the vault directory can be unlocked from the login page.
+Each vault gets its own connection settings, memory replica, write lock,
+checkpoint timer, backups and maintenance, created on first use and
+unloaded again once nobody has used the vault for a while.
+"""
+
+import os
+import random
+import threading
+import time
+
+from backup import BackupScheduler
+from maintenance import MaintenanceScheduler
+from memory_replica import MemoryReplica
+from vault import checkpoint, derive_key, is_locked_error, migrate, open_vault, sqlcipher
+
+VAULT_DIR = '.'
+DEFAULT_VAULT = 'passwords'
+VAULT_IDLE_TIMEOUT = 30 * 60  # seconds without requests before a vault is unloaded
+VAULT_SWEEP_INTERVAL = 60
+
+# Checkpoint the WAL back into the vault file at most this often (seconds)
+CHECKPOINT_INTERVAL = 60
+
+# Write retries when another device holds the write lock longer than busy_timeout
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.05  # seconds, doubled on every attempt
+
+
+class LoadedVault:
+    """State the server keeps for one vault file while it is in use"""
+
+    def __init__(self, name, db_path, replica_enabled=False):
+        self.name = name
+        self.db_path = db_path
+        self.replica = MemoryReplica(enabled=replica_enabled)
+        self.backups = BackupScheduler(db_path)
+        self.maintenance = MaintenanceScheduler(db_path, guard=self.replica.external_write)
+        self.last_used = time.monotonic()
+        self.loaded_at = time.time()
+        self.last_checkpoint = time.monotonic()
+        self.checkpoint_lock = threading.Lock()
+        self.held = None
+
+    def connect(self, key):
+        """Connection to the vault file, or None if the key doesn't open it.
+        Lock errors are raised: another device being busy is no reason to log anyone out."""
+        try:
+            conn = open_vault(key, self.db_path)
+            # Test connection by running a simple query
+            conn.execute("SELECT COUNT(*) FROM folders")
+            conn.row_factory = sqlcipher.Row
+            return conn
+        except Exception as e:
+            if is_locked_error(e):
+                raise
+            return None
+
+    def read_connection(self, key):
+        """Connection for SELECTs: the memory replica when enabled, else the vault file"""
+        conn = self.replica.connect()
+        if conn:
+            return conn
+        conn = self.connect(key)
+        if conn and self.replica.enabled and self.replica.conn is None:
+            # Reload a dropped copy for the next reads; this one already has the file open
+            self.replica.load(self.db_path, key)
+        return conn
+
+    def write(self, conn, writes):
+        """Commit (sql, params) writes to the vault file, then replay them on the replica.
+        Only this transaction is retried while another device holds the write lock;
+        the last locked error is raised if it never frees up."""
+        for attempt in range(WRITE_RETRIES):
+            with self.replica.writing():
+                try:
+                    for sql, params in writes:
+                        conn.execute(sql, params)
+                    conn.commit()
+                except sqlcipher.OperationalError as e:
+                    conn.rollback()
+                    if not is_locked_error(e) or attempt == WRITE_RETRIES - 1:
+                        raise
+                else:
+                    # Checkpoint before the replay, which records the file's new stamp
+                    self.maybe_checkpoint(conn)
+                    self.replica.apply(writes)
+                    break
+            delay = WRITE_RETRY_DELAY * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+
+    def maybe_checkpoint(self, conn):
+        """Run a passive WAL checkpoint if the last one was long enough ago"""
+        with self.checkpoint_lock:
+            if time.monotonic() - self.last_checkpoint < CHECKPOINT_INTERVAL:
+                return
+            self.last_checkpoint = time.monotonic()
+        try:
+            checkpoint(conn)
+        except sqlcipher.OperationalError:
+            pass
+
+    def unlocked(self, key, conn):
+        """Take over the migrated connection VaultRegistry.unlock opened with the new key"""
+        if self.replica.enabled:
+            self.replica.load(self.db_path, key)
+            # Closing the last connection checkpoints the WAL, which would look like an
+            # outside write and drop the copy: one connection stays open while loaded
+            with self.checkpoint_lock:
+                if self.held is None:
+                    self.held, conn = conn, None
+        if conn is not None:
+            conn.close()
+
+    def touch(self, key):
+        """A request used this vault: keep it loaded and its schedules running"""
+        self.last_used = time.monotonic()
+        self.maintenance.touch()
+        if self.backups.thread is None:
+            self.arm(key)
+
+    def arm(self, key):
+        self.backups.arm(key)
+        self.maintenance.arm(key)
+
+    def unload(self):
+        self.replica.close()
+        if self.held is not None:
+            self.held.close()
+            self.held = None
+        self.backups.stop()
+        self.maintenance.stop()
+
+    def status(self):
+        return {
+            'name': self.name,
+            'idle_seconds': round(time.monotonic() - self.last_used),
+            'replica_loaded': self.replica.conn is not None,
+        }
+
+
+class VaultRegistry:
+    """The vault files in `vault_dir`, loaded on demand"""
+
+    def __init__(self, vault_dir=VAULT_DIR, replica_enabled=False, idle_timeout=VAULT_IDLE_TIMEOUT):
+        self.vault_dir = vault_dir
+        self.replica_enabled = replica_enabled
+        self.idle_timeout = idle_timeout
+        self.loaded = {}
+        self.unloaded = 0
+        self.lock = threading.Lock()
+        self.sweeper = None
+
+    def available(self):
+        """{name: path} of the vault files that can be unlocked"""
+        try:
+            names = sorted(os.listdir(self.vault_dir))
+        except FileNotFoundError:
+            return {}
+        return {name[:-3]: os.path.join(self.vault_dir, name) for name in names
+                if name.endswith('.db') and os.path.isfile(os.path.join(self.vault_dir, name))}
+
+    def default(self):
+        names = list(self.available())
+        return DEFAULT_VAULT if DEFAULT_VAULT in names else (names[0] if names else None)
+
+    def get(self, name):
+        """The loaded vault called `name`, loading it if needed; None if there is no such file"""
+        with self.lock:
+            vault = self.loaded.get(name)
+            if vault is None:
+                path = self.available().get(name)
+                if path is None:
+                    return None
+                vault = self.loaded[name] = LoadedVault(name, path, self.replica_enabled)
+                if self.sweeper is None:
+                    self.sweeper = threading.Thread(target=self._sweep, name='vault-sweeper', daemon=True)
+                    self.sweeper.start()
+            vault.last_used = time.monotonic()
+            return vault
+
+    def unlock(self, name, password):
+        """Verify the master password of vault `name` (runs on the unlock pool). The vault is
+        only loaded once the password opens it; returns (vault, key), or None if it's wrong.
+        The key opens later connections without running the KDF again."""
+        path = self.available().get(name)
+        if path is None:
+            return None
+        try:
+            key = derive_key(password, path)
+            conn = open_vault(key, path)
+        except Exception:
+            return None
+        try:
+            migrate(conn)
+            vault = self.get(name)
+            vault.unlocked(key, conn)
+        except Exception:
+            conn.close()
+            raise
+        return vault, key
+
+    def peek(self, name):
+        """The vault if it is currently loaded, without loading it"""
+        return self.loaded.get(name)
+
+    def _sweep(self):
+        while True:
+            time.sleep(min(VAULT_SWEEP_INTERVAL, self.idle_timeout))
+            now = time.monotonic()
+            with self.lock:
+                idle = [name for name, vault in self.loaded.items()
+                        if now - vault.last_used > self.idle_timeout]
+                for name in idle:
+                    self.loaded.pop(name).unload()
+                    self.unloaded += 1
+
+    def status(self):
+        return {
+            'available': list(self.available()),
+            'loaded': [vault.status() for vault in self.loaded.values()],
+            'unloaded': self.unloaded,
+        }